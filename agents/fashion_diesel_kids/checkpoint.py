@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+
+# これより古いジャーナルからは再開しない（前回の途中経過が古すぎる場合は最初からやり直す）
+DEFAULT_RESUME_MAX_AGE_SECONDS = 24 * 60 * 60
+
+
+class RunJournal:
+    """
+    1回の実行の途中経過を、1行1件のJSON（JSONL）で追記していくジャーナル。
+
+    見つけた商品（discovered）と、商品ごとの判定結果（verdict）を見つけ次第書き込むため、
+    タイムアウトなどで実行が途中で止まっても、次の実行で --resume を付ければ続きから再開できる。
+    最後まで終わった実行には completed を書き込み、次の実行は最初からやり直す。
+
+    行の形式:
+        {"type": "started", "at": 時刻}
+        {"type": "discovered", "product": 商品レコード}
+        {"type": "verdict", "product": 商品レコード, "judged_by": ..., "has_size": ..., "sizes": [...]}
+        {"type": "completed", "at": 時刻}
+
+    使い方:
+        journal = RunJournal(path)
+        state = journal.start(resume=True)   # 再開できる場合は前回の途中経過を返す
+        journal.record_discovered(product)
+        journal.record_verdict(record)
+        journal.mark_completed()
+    """
+
+    def __init__(self, path: str, resume_max_age_seconds: int = DEFAULT_RESUME_MAX_AGE_SECONDS):
+        self.path = path
+        self.resume_max_age_seconds = resume_max_age_seconds
+        self._lock = threading.Lock()
+        self._file = None
+
+    def start(self, resume: bool) -> dict:
+        """
+        ジャーナルへの書き込みを始める。
+
+        resume が True で、前回の実行が途中で止まっていれば、その途中経過を読み込んで続きに追記する。
+        それ以外の場合はジャーナルを空にして最初から書き込む。
+
+        Returns:
+            {"discovered": {URL: 商品レコード}, "verdicts": {URL: 判定レコード}}（最初からの場合は空）
+        """
+        state = {"discovered": {}, "verdicts": {}}
+        if resume:
+            previous = self._load()
+            if previous is None:
+                print("情報: 再開できる途中経過がないため、最初から実行します。")
+            else:
+                state = previous
+                print(f"情報: 前回の途中経過から再開します"
+                      f"（商品 {len(state['discovered'])} 件 / 判定済み {len(state['verdicts'])} 件）")
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if state["discovered"] or state["verdicts"]:
+            self._file = open(self.path, "a", encoding="utf-8")
+            # 強制終了で最後の行が書きかけのまま残っていたら、改行してから続きを書く
+            if self._file.tell() > 0:
+                with open(self.path, "rb") as journal_file:
+                    journal_file.seek(-1, os.SEEK_END)
+                    if journal_file.read(1) != b"\n":
+                        self._file.write("\n")
+        else:
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._write({"type": "started", "at": time.time()})
+        return state
+
+    def record_discovered(self, product: dict):
+        """見つけた商品を書き込む"""
+        self._write({"type": "discovered", "product": product})
+
+    def record_verdict(self, record: dict):
+        """商品の判定結果を書き込む"""
+        self._write({
+            "type": "verdict",
+            "product": record["product"],
+            "judged_by": record["judged_by"],
+            "has_size": record["has_size"],
+            "sizes": record["sizes"],
+        })
+
+    def mark_completed(self):
+        """実行が最後まで終わったことを書き込む（次の実行は再開せずに最初からになる）"""
+        self._write({"type": "completed", "at": time.time()})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, entry: dict):
+        # 実行が強制終了されても書いた分は残るよう、1行ごとにディスクへ書き出す
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def _load(self) -> dict | None:
+        """前回の途中経過を読み込む（ジャーナルがない・完了済み・古すぎる場合は None）"""
+        if not os.path.exists(self.path):
+            return None
+
+        discovered = {}
+        verdicts = {}
+        started_at = None
+        with open(self.path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 強制終了で書きかけになった最後の行は無視する
+                    continue
+                entry_type = entry.get("type")
+                if entry_type == "started":
+                    started_at = entry.get("at")
+                elif entry_type == "completed":
+                    return None
+                elif entry_type == "discovered":
+                    discovered[entry["product"]["url"]] = entry["product"]
+                elif entry_type == "verdict":
+                    verdicts[entry["product"]["url"]] = {key: value for key, value in entry.items() if key != "type"}
+
+        if started_at is None or time.time() - started_at > self.resume_max_age_seconds:
+            return None
+        return {"discovered": discovered, "verdicts": verdicts}
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+
+from agents.fashion_diesel_kids.size_rules import TARGET_SIZES
+
+BATCH_PROMPT_TEMPLATE = """
+あなたはファッション選定AIです。
+以下は複数のECサイトの商品ページのテキストです。商品ごとに、
+「14Y」または「16Y」のサイズが購入可能（在庫あり）かどうかを判断してください。
+
+次の形式のJSON配列だけを返してください。すべての商品IDを1回ずつ含めてください。
+[{{"id": "商品ID", "available_sizes": ["14Y", "16Y"]}}]
+購入可能な目的サイズがない商品は "available_sizes" を空配列 [] にしてください。
+
+{product_blocks}
+"""
+
+PRODUCT_BLOCK_TEMPLATE = """--- 商品ID: {product_id} ---
+{page_text}
+"""
+
+# 1回の呼び出しに含める商品数と、プロンプト全体の推定トークン数の上限
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_TOKEN_BUDGET = 40000
+
+# 1商品あたりのテキスト長の上限（文字数）
+MAX_CHARS_PER_PRODUCT = 10000
+
+JSON_ARRAY_PATTERN = re.compile(r"\[.*\]", re.DOTALL)
+
+# API呼び出しの失敗・使えない回答のときに、バッチ全体を送り直す回数と、待ち時間（指数バックオフ）の基準・上限の秒数
+DEFAULT_BATCH_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 2.0
+DEFAULT_BACKOFF_MAX = 30.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    プロンプトのトークン数を見積もる（API呼び出しなし）。
+    日本語はおおむね1文字1トークン以下のため、文字数をそのまま上限の見積もりとして使う。
+    """
+    return len(text)
+
+
+def build_batches(
+    items: list[tuple[str, str]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+) -> list[list[tuple[str, str]]]:
+    """
+    (商品ID, テキスト) のリストを、商品数とトークン数の上限を超えないバッチに分ける。
+    1商品だけで上限を超える場合も、その商品だけのバッチにする。
+    """
+    overhead = estimate_tokens(BATCH_PROMPT_TEMPLATE)
+    batches = []
+    current = []
+    current_tokens = overhead
+
+    for product_id, page_text in items:
+        item_tokens = estimate_tokens(PRODUCT_BLOCK_TEMPLATE.format(product_id=product_id, page_text=page_text))
+        if current and (len(current) >= batch_size or current_tokens + item_tokens > token_budget):
+            batches.append(current)
+            current = []
+            current_tokens = overhead
+        current.append((product_id, page_text))
+        current_tokens += item_tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(response_text: str, expected_ids: set[str]) -> dict[str, list[str]]:
+    """
+    AIの回答（JSON配列）を検証し、商品IDごとの購入可能サイズを返す。
+
+    形式に合わない要素（IDが不明・available_sizes が文字列の配列でない など）は無視する。
+    目的サイズ以外のサイズは取り除く。
+
+    Returns:
+        {商品ID: 購入可能な目的サイズのリスト}（回答に含まれていた商品IDのみ）
+    """
+    match = JSON_ARRAY_PATTERN.search(response_text)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, list):
+        return {}
+
+    results = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        product_id = entry.get("id")
+        sizes = entry.get("available_sizes")
+        if not isinstance(product_id, str) or product_id not in expected_ids:
+            continue
+        if not isinstance(sizes, list) or not all(isinstance(size, str) for size in sizes):
+            continue
+        normalized = {size.strip().upper() for size in sizes}
+        results[product_id] = [size for size in TARGET_SIZES if size in normalized]
+    return results
+
+
+class BatchSizeClassifier:
+    """
+    複数商品のテキストを1回のGemini呼び出しにまとめて、14Y / 16Y の在庫を判定する。
+
+    回答はJSON配列で受け取り、parse_batch_response で検証する。
+    有効な回答に含まれなかった商品だけを、同じ形式のプロンプトで1件だけのバッチにして判定し直す
+    （購入可能なサイズのリストもそのまま受け取れる）。
+    API呼び出しの失敗（429 など）や使えない回答のときは、1件ずつに分けると呼び出しが増えるだけなので、
+    バッチ全体を待ち時間を延ばしながら max_retries 回まで送り直し、それでも駄目なら判定失敗（None）とする。
+
+    使い方:
+        classifier = BatchSizeClassifier(model)
+        results = classifier.classify({"url1": text1, "url2": text2})
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        max_retries: int = DEFAULT_BATCH_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.token_budget = token_budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self.api_calls = 0
+        self.batched_items = 0
+        self.retried_items = 0
+        self.batch_retries = 0
+        self.failed_items = 0
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def classify_batch(self, batch: list[tuple[str, str]]) -> dict[str, list[str]] | None:
+        """
+        1バッチ分をまとめて判定する（回答に含まれなかった商品は結果に含まれない）。
+        API呼び出しの失敗・使えない回答のときはバッチ全体を送り直し、それでも駄目なら None を返す。
+        """
+        product_blocks = "\n".join(
+            PRODUCT_BLOCK_TEMPLATE.format(product_id=product_id, page_text=page_text)
+            for product_id, page_text in batch
+        )
+        prompt = BATCH_PROMPT_TEMPLATE.format(product_blocks=product_blocks)
+        expected_ids = {product_id for product_id, _ in batch}
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("batch_retries")
+                # ゆらぎ（ジッター）付きの指数バックオフ
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+            self._count("api_calls")
+            try:
+                response = self.model.generate_content(
+                    prompt,
+                    generation_config={"response_mime_type": "application/json"},
+                )
+                answers = parse_batch_response(response.text, expected_ids)
+            except Exception as e:
+                print(f"  [エラー] API呼び出し失敗（{len(batch)}件まとめて判定 / {attempt + 1}回目）: {e}")
+                continue
+
+            if answers:
+                return answers
+            print(f"  [警告] AIの回答を読み取れませんでした（{len(batch)}件まとめて判定 / {attempt + 1}回目）")
+
+        return None
+
+    def classify(self, items: dict[str, str]) -> dict[str, tuple[bool, list[str]]]:
+        """
+        複数商品をバッチにまとめて判定する。
+
+        Args:
+            items: {商品キー（URLなど）: ページテキスト}
+
+        Returns:
+            {商品キー: (目的サイズが購入可能か, 購入可能なサイズのリスト)}。
+            バッチの判定に失敗した商品と、1件ずつの判定し直しでも回答が得られなかった商品は、
+            購入可能かどうかが None になる
+        """
+        # プロンプト内では短いIDを使い、回答から元のキーに戻す
+        keys = list(items)
+        id_to_key = {f"p{index + 1}": key for index, key in enumerate(keys)}
+        numbered = [
+            (product_id, items[key][:MAX_CHARS_PER_PRODUCT])
+            for product_id, key in id_to_key.items()
+        ]
+
+        results = {}
+        for batch in build_batches(numbered, self.batch_size, self.token_budget):
+            answers = self.classify_batch(batch)
+            if answers is None:
+                # 送り直しても判定できなかったバッチは、1件ずつに分けずに判定失敗とする
+                self._count("failed_items", len(batch))
+                for product_id, _ in batch:
+                    results[id_to_key[product_id]] = (None, [])
+                continue
+            self._count("batched_items", len(answers))
+
+            for product_id, page_text in batch:
+                key = id_to_key[product_id]
+                if product_id in answers:
+                    sizes = answers[product_id]
+                    results[key] = (bool(sizes), sizes)
+                else:
+                    # 有効な回答から漏れた商品だけを、1件だけのバッチで判定し直す
+                    self._count("retried_items")
+                    single_answers = self.classify_batch([(product_id, page_text)])
+                    if single_answers is None or product_id not in single_answers:
+                        self._count("failed_items")
+                        results[key] = (None, [])
+                        continue
+                    sizes = single_answers[product_id]
+                    results[key] = (bool(sizes), sizes)
+
+        return results
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        return (
+            f"API呼び出し {self.api_calls} 回"
+            f"（まとめて判定 {self.batched_items} 件 / 1件ずつ再判定 {self.retried_items} 件"
+            f" / バッチの送り直し {self.batch_retries} 回 / 判定失敗 {self.failed_items} 件）"
+        )
@@ -1,8 +1,14 @@
-import time
+from __future__ import annotations
+
+import argparse
+import asyncio
 import os
+import re
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from playwright.sync_api import sync_playwright
+import threading
+import time
+import unicodedata
+from collections import Counter
 import google.generativeai as genai
 from dotenv import load_dotenv
 
@@ -10,124 +16,713 @@ load_dotenv()
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from common.scrapers.yahoo import fetch_yahoo_links_playwright
-from common.discord import send_discord_notification
+from common.concurrency import AdaptiveLimiter, LimitedClient
+from common.scrapers.browser_pool import BrowserPool
+from common.scrapers.http_client import FetchStats, HttpClient
+from common.scrapers.request_filter import DEFAULT_BLOCKED_HOST_PATTERNS, RequestFilter
+from common.scrapers.yahoo import USER_AGENT, YahooHttpFetcher, YahooSearchPaginator, canonicalize_product_url
+from common.notified_index import NotifiedIndex
+from common.notifiers import FanOutNotifier, load_destinations
+from common.outbox import NotificationOutbox
+from agents.fashion_diesel_kids.checkpoint import RunJournal
+from agents.fashion_diesel_kids.llm_batch import BatchSizeClassifier
+from agents.fashion_diesel_kids.pipeline import SizeCheckPipeline
+from agents.fashion_diesel_kids.product_state import ProductStateStore, listing_signature, page_content_hash
+from agents.fashion_diesel_kids.size_rules import AVAILABLE, UNKNOWN, classify_size_availability
+from agents.fashion_diesel_kids.snippets import extract_size_snippets, format_savings
+from agents.fashion_diesel_kids.verdict_cache import VerdictCache
 
 API_KEY = os.getenv("GOOGLE_AI_STUDIO_API_KEY")
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 
+MODEL_NAME = 'gemini-2.5-flash'
+
 genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
+model = genai.GenerativeModel(MODEL_NAME)
 
-# 並列処理の設定
-MAX_WORKERS = 5  # 同時処理数
+# 実行をまたいで保存するデータ（AI判定キャッシュなど）の置き場所
+STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".state")
 
-PROMPT_TEMPLATE = """
-あなたはファッション選定AIです。
-以下のECサイトのページテキストを読み、この商品に「14Y」または「16Y」のサイズが
-利用可能かどうかを判断してください。
+# 並列処理の設定（パイプラインのステージごとの同時実行数）
+# ページ取得とAI呼び出しは、応答の様子を見て *_INITIAL_CONCURRENCY から上限まで自動で上げ下げする
+PAGE_WINDOW = 4  # 検索結果ページの同時取得数
+FETCH_CONCURRENCY = 8  # ページの同時取得数の上限
+FETCH_INITIAL_CONCURRENCY = 3
+EXTRACT_CONCURRENCY = 2  # ルール判定・抜き出しの同時実行数
+LLM_CONCURRENCY = 6  # AI呼び出しの同時実行数の上限
+LLM_INITIAL_CONCURRENCY = 2
+# この秒数より遅い応答は「混み始めている」とみなし、同時実行数を上げるきっかけにしない
+# （ページ取得はHTTPが1秒前後、ブラウザでのフォールバックが数秒。AI呼び出しは1回で最大 LLM_BATCH_SIZE 件を判定する）
+FETCH_LATENCY_TARGET_SECONDS = 8.0
+LLM_LATENCY_TARGET_SECONDS = 30.0
+PIPELINE_QUEUE_SIZE = 20  # ステージ間のキューに溜められる件数（一杯になると前段が待つ）
+BROWSER_POOL_SIZE = 3  # 商品ページ用に起動しておくブラウザ数（HTTPで取得できない場合だけ使う）
+CONTEXT_RECYCLE_AFTER = 20  # 何ページごとにブラウザのコンテキストを作り直すか
+LLM_BATCH_SIZE = 8  # 1回のAI呼び出しにまとめる商品数
+LLM_TOKEN_BUDGET = 40000  # 1回のAI呼び出しのプロンプトの推定トークン数の上限
 
-「はい」（利用可能）か「いいえ」（利用不可）のみで回答してください。
+# AI判定キャッシュの設定（プロンプトを変えたら PROMPT_VERSION を上げる）
+PROMPT_VERSION = "size-v3"
+VERDICT_CACHE_TTL_DAYS = 14
+VERDICT_CACHE_MAX_ENTRIES = 5000
 
---- ページテキスト ---
-{page_text}
----
-回答:
-"""
+# AIに渡すテキストの設定（サイズ・在庫のキーワードの前後だけを抜き出す）
+SNIPPET_WINDOW_CHARS = 300  # キーワードの前後に含める文字数
+SNIPPET_MAX_CHARS = 4000  # 1商品あたりの上限
 
+# 前回の実行で判定済みだった商品・前回から変わっていない商品の判定方法（ログ・集計用）
+RESUMED_JUDGE = "前回分"
+UNCHANGED_JUDGE = "変更なし"
 
-def fetch_page_text(url: str) -> str:
-    """ページのテキストを取得する"""
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = context.new_page()
-        try:
-            page.goto(url, timeout=30000, wait_until="domcontentloaded")
-            return page.locator("body").inner_text()
-        except Exception as e:
-            print(f"  [エラー] ページアクセス失敗: {url} - {e}")
-            return ""
-        finally:
-            browser.close()
+# ページを取得できなかった・AI判定に失敗した商品の判定方法（判定済みとして扱わず、--resume で確認し直す）
+FAILED_JUDGE = "失敗"
 
+# 検索結果のタイトル・価格が前回と同じ商品を、ページを確認せずに前回の判定結果で済ませる期間
+# （在庫は掲載情報を変えずに動くため、これを過ぎたら条件付きGET・内容のハッシュで確かめ直す）
+LISTING_TRUST_HOURS = 24
 
-def check_size_with_ai(page_text: str) -> bool:
-    """AIでサイズをチェックする"""
-    if not page_text:
-        return False
+# 見つかった商品は、最初の1件からこの秒数以内（または10件揃った時点）でDiscordに送る
+NOTIFY_MAX_LATENCY_SECONDS = 60
+
+# 通知先の設定ファイル（ない場合は DISCORD_WEBHOOK_URL のDiscordだけに送る）
+NOTIFY_DESTINATIONS_FILE = os.getenv(
+    "NOTIFY_DESTINATIONS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "notify_destinations.json"),
+)
+
+# True なら、商品ごとのカードではなく1行ずつのリンクの一覧で通知する（1メッセージに数十件入る）
+NOTIFY_COMPACT_LINKS = os.getenv("DISCORD_COMPACT_LINKS", "").lower() in ("1", "true", "yes")
+
+# 通知済みの商品・サイズは、この日数がたつまで再通知しない（新着・値下がり・サイズの追加は通知する）
+RENOTIFY_AFTER_DAYS = 28
+
+# --deadline を指定したときに、締め切りの前に残しておく時間（通知と状態の保存のため）
+DEADLINE_RESERVE_SECONDS = 90
+
+# 探しているサイズ（年齢表記）
+TARGET_SIZE_YEARS = (14, 16)
+
+# 検索結果のタイトルにこれらが含まれる商品は、14Y/16Yの展開がないため商品ページを開かない
+EXCLUDE_TITLE_KEYWORDS = ("ベビー", "BABY", "Baby", "新生児")
+
+# 同時実行数を自動で調整するリミッタ（タイムアウト・429・5xx で下げ、応答が速くエラーがなければ上げる）
+fetch_limiter = AdaptiveLimiter(
+    "ページ取得",
+    initial=FETCH_INITIAL_CONCURRENCY,
+    max_limit=FETCH_CONCURRENCY,
+    latency_target=FETCH_LATENCY_TARGET_SECONDS,
+)
+llm_limiter = AdaptiveLimiter(
+    "AI呼び出し",
+    initial=LLM_INITIAL_CONCURRENCY,
+    max_limit=LLM_CONCURRENCY,
+    latency_target=LLM_LATENCY_TARGET_SECONDS,
+)
+
+# AI呼び出しはすべてリミッタを通す
+limited_model = LimitedClient(model, llm_limiter, methods=("generate_content",))
+
+# 商品の確認・通知に使う接続と、.state に保存する状態は、--help などでファイルや接続を作らないよう、
+# 実行時に open_notification_state() / open_check_resources() で作る
+
+# ブラウザを使わない高速経路（HTTP）と、経路ごとの取得件数
+http_fetcher: YahooHttpFetcher | None = None
+fetch_stats = FetchStats()
+
+# 判定方法ごとの件数（ルールで判定 / AIで判定）
+judge_counts = Counter()
+judge_lock = threading.Lock()
+
+# AIに渡すテキストの文字数の合計（抜き出し前 / 抜き出し後）
+prompt_chars = Counter()
+
+# ブラウザで開くときに読み込まないリソース（商品ページの判定に画像・動画・フォントは不要）
+request_filter = RequestFilter(
+    blocked_resource_types=("image", "media", "font"),
+    blocked_host_patterns=DEFAULT_BLOCKED_HOST_PATTERNS,
+)
+
+# 商品ページ用のブラウザプール（ワーカーごとにブラウザを起動したまま使い回す）
+browser_pool: BrowserPool | None = None
+
+# ページ内容が前回と同じ商品は、AIを呼ばずに前回の判定結果を使う
+verdict_cache: VerdictCache | None = None
+
+# 前回までに通知した商品・サイズ（実行をまたいで同じ商品を何度も通知しないため）
+notified_index: NotifiedIndex | None = None
+
+# 通知済みのため通知を省いた、今回も在庫があった商品の件数
+still_available = Counter()
+
+
+def product_notify_key(product: dict) -> str:
+    """通知済みかどうかを調べるための商品のキー（ストアID/商品コード。取れなければURL）"""
+    key = canonicalize_product_url(product["url"])
+    return "/".join(key) if key else product["url"]
+
+
+# 送る前の通知を書き込んでおく送信箱（送れなかった通知は、次の実行または --flush で送り直す）
+outbox: NotificationOutbox | None = None
+
+
+def outbox_key(destination: str, product: dict) -> str:
+    """送信箱の冪等キー（同じ通知先への同じ商品・サイズ・価格の通知は同じキーになる）"""
+    sizes = "/".join(sorted(product.get("sizes", [])))
+    return f"{destination}|{product_notify_key(product)}|{sizes}|{product.get('price') or ''}"
+
+
+def mark_products_notified(destination: str, products: list[dict]):
+    """通知先に送れた商品を、通知済みとして記録する"""
+    for product in products:
+        notified_index.mark_notified(product_notify_key(product), product.get("sizes", []), product.get("price"))
+    outbox.mark_sent([outbox_key(destination, product) for product in products])
+
+
+def mark_products_failed(destination: str, products: list[dict]):
+    """通知先に送れなかった商品を、送信箱に記録する（未送信のまま残り、あとで送り直す）"""
+    outbox.mark_failed([outbox_key(destination, product) for product in products], f"{destination} への送信に失敗しました")
+
+
+# True の実行では、見つかった商品を送らずに通知済みとして記録するだけにする（--seed-notified）
+seed_notified = False
+
+# 見つかった商品を、全件の確認を待たずに少しずつ、設定した通知先すべてに送る通知
+# （Webhook URLの環境変数がなくても --help などは動くよう、実行時に build_notifier() で作る）
+notifier: FanOutNotifier | None = None
+
+
+def build_notifier() -> FanOutNotifier:
+    """通知先の設定を読み込んで通知を作る（必須の通知先のWebhook URLがなければ ValueError）"""
+    return FanOutNotifier(
+        load_destinations(NOTIFY_DESTINATIONS_FILE, DISCORD_WEBHOOK_URL),
+        max_latency_seconds=NOTIFY_MAX_LATENCY_SECONDS,
+        on_sent=mark_products_notified,
+        on_failed=mark_products_failed,
+        compact=NOTIFY_COMPACT_LINKS,
+    )
+
+
+def open_notification_state():
+    """通知済みの記録と送信箱を開く（商品の確認でも --flush でも使う）"""
+    global notified_index, outbox
+    notified_index = NotifiedIndex(
+        os.path.join(STATE_DIR, "notified.sqlite3"),
+        renotify_after_seconds=RENOTIFY_AFTER_DAYS * 24 * 60 * 60,
+    )
+    outbox = NotificationOutbox(os.path.join(STATE_DIR, "outbox.sqlite3"))
+
+
+def notify_match(product: dict):
+    """商品を、送信箱に書き込んでから各通知先に送る（送信箱に未送信で残っている通知先には送らない）"""
+    for destination in notifier.destination_names:
+        if outbox.enqueue(outbox_key(destination, product), product, destination=destination):
+            notifier.add_to(destination, product)
+
+
+def resend_pending_notifications() -> int:
+    """前回までに送れなかった送信箱の通知を、通知先ごとに送り直す。送り直す件数を返す"""
+    resent = 0
+    for destination in notifier.destination_names:
+        for _, item in outbox.pending(destination):
+            notifier.add_to(destination, item)
+            resent += 1
+
+    if resent:
+        print(f"情報: 前回までに送れなかった通知 {resent} 件を送り直します。")
+    return resent
+
+
+def count_pending_notifications() -> int:
+    """
+    今回設定されている通知先の、まだ送れていない通知の件数を返す。
+    設定にない通知先（環境変数のない optional の通知先など）の分は送らないため、件数に含めずに知らせる
+    （その分は期限が過ぎたら送信箱から消える）。
+    """
+    pending = 0
+    for destination, count in outbox.pending_counts().items():
+        if destination in notifier.destination_names:
+            pending += count
+        else:
+            print(f"情報: 今回の設定にない通知先 {destination} の未送信の通知 {count} 件は送りません"
+                  f"（{outbox.keep_pending_seconds // (24 * 60 * 60)}日たつと消えます）。")
+    return pending
+
+
+# 商品ごとの前回の状態（掲載情報の署名・ページ内容のハッシュ・判定結果・ETag / Last-Modified）
+product_state: ProductStateStore | None = None
+
+# ページ取得時に受け取った ETag / Last-Modified（判定が終わったら商品の状態と一緒に保存する）
+page_validators = {}
+
+# 実行の途中経過（見つけた商品・判定結果）を書き込むジャーナル（--resume で続きから再開する）
+journal: RunJournal | None = None
+
+
+def open_check_resources():
+    """商品の確認に使う接続（HTTP・ブラウザプール）と、判定キャッシュ・商品の状態・ジャーナルを開く"""
+    global http_fetcher, browser_pool, verdict_cache, product_state, journal
+    http_fetcher = YahooHttpFetcher(HttpClient(user_agent=USER_AGENT, pool_size=FETCH_CONCURRENCY, limiter=fetch_limiter))
+    browser_pool = BrowserPool(
+        user_agent=USER_AGENT,
+        size=BROWSER_POOL_SIZE,
+        recycle_after=CONTEXT_RECYCLE_AFTER,
+        request_filter=request_filter,
+    )
+    verdict_cache = VerdictCache(
+        os.path.join(STATE_DIR, "verdict_cache.sqlite3"),
+        model_name=MODEL_NAME,
+        prompt_version=PROMPT_VERSION,
+        ttl_seconds=VERDICT_CACHE_TTL_DAYS * 24 * 60 * 60,
+        max_entries=VERDICT_CACHE_MAX_ENTRIES,
+    )
+    product_state = ProductStateStore(os.path.join(STATE_DIR, "product_state.sqlite3"))
+    journal = RunJournal(os.path.join(STATE_DIR, "run_journal.jsonl"))
+
+
+def fetch_page_text(url: str, previous: dict | None = None) -> str | None:
+    """
+    ページのテキストを取得する。
+    まずHTTPで取得したHTML・埋め込みJSONを解析し、失敗した場合だけPlaywrightで開く。
+    前回の状態（previous）に ETag / Last-Modified があれば条件付きで取得し、
+    変更がなかった（304）場合は None を返す。
+    """
+    etag = previous["etag"] if previous else None
+    last_modified = previous["last_modified"] if previous else None
+
+    result = http_fetcher.fetch_item_text_if_modified(url, etag, last_modified)
+    if result is not None and (result["not_modified"] or result["text"]):
+        with judge_lock:
+            page_validators[url] = (result["etag"], result["last_modified"])
+        if result["not_modified"]:
+            fetch_stats.record("not_modified")
+            return None
+        fetch_stats.record("http")
+        return result["text"]
+
+    # 429 を受けた直後は、ブラウザでも同じサイトに送るため、Retry-After が過ぎるまで待つ
+    http_fetcher.client.wait_if_rate_limited()
+    page_text = fetch_page_text_with_browser(url)
+    fetch_stats.record("playwright" if page_text else "failed")
+    return page_text
+
+
+def fetch_page_text_with_browser(url: str) -> str:
+    """ブラウザプールでページを開き、body のテキストを取得する"""
     try:
-        prompt = PROMPT_TEMPLATE.format(page_text=page_text[:10000])  # テキスト長を制限
-        response = model.generate_content(prompt)
-        ai_answer = response.text.strip().lower()
-        return "はい" in ai_answer
+        return fetch_limiter.call(browser_pool.fetch_text, url)
     except Exception as e:
-        print(f"  [エラー] API呼び出し失敗: {e}")
+        print(f"  [エラー] ページアクセス失敗: {url} - {e}")
+        return ""
+
+
+# 複数商品をまとめてAIに判定させる分類器（回答から漏れた商品は、1件だけのバッチで判定し直す）
+batch_classifier = BatchSizeClassifier(
+    limited_model,
+    batch_size=LLM_BATCH_SIZE,
+    token_budget=LLM_TOKEN_BUDGET,
+)
+
+
+def is_size_candidate(product: dict) -> bool:
+    """
+    検索結果のタイトルだけで、目的のサイズがあり得ない商品を除外する。
+    （ベビー向けの商品や、タイトルに書かれたサイズがすべて14Y未満の商品など）
+    """
+    title = product.get("title", "")
+    if any(keyword in title for keyword in EXCLUDE_TITLE_KEYWORDS):
         return False
 
+    listed_years = [int(year) for year in re.findall(r"(\d{1,2})\s*(?:Y|歳)", title)]
+    if listed_years and max(listed_years) < min(TARGET_SIZE_YEARS):
+        return False
+    return True
 
-def check_page_for_size(url: str, index: int, total: int) -> tuple[str, bool]:
-    """1商品のサイズチェック（並列処理用）"""
-    print(f"  [{index+1}/{total}] チェック中: {url[:60]}...")
-    page_text = fetch_page_text(url)
-    has_size = check_size_with_ai(page_text)
-    status = "★ サイズあり" if has_size else "- サイズなし"
-    print(f"  [{index+1}/{total}] {status}")
-    return (url, has_size)
 
-# --- メイン実行 ---
-if __name__ == "__main__":
+def unchanged_record(product: dict, previous: dict) -> dict:
+    """前回から変わっていない商品の判定レコード（前回の判定結果をそのまま使う）"""
+    return {
+        "product": product,
+        "judged_by": UNCHANGED_JUDGE,
+        "has_size": previous["has_size"],
+        "sizes": previous["sizes"],
+        "content_hash": previous["content_hash"],
+    }
 
-    BASE_SEARCH_URL = "https://shopping.yahoo.co.jp/search?p=%E3%83%87%E3%82%A3%E3%83%BC%E3%82%BC%E3%83%AB%E3%82%AD%E3%83%83%E3%82%BA+%E3%82%A2%E3%82%A6%E3%83%88%E3%83%AC%E3%83%83%E3%83%88"
-    ITEMS_PER_PAGE = 30
-    all_product_links = set()
-    page_num = 1
 
-    print("ステップ1：全商品リンクの収集を開始します...")
+def fetch_product_text(product: dict) -> str | dict:
+    """
+    ページ取得ステージ: 1商品のページテキストを取得する。
+    条件付きGETでページが前回から変わっていないと分かった場合は、前回の判定レコードを返す。
+    """
+    print(f"  チェック中: {product.get('title') or product['url'][:60]}...")
+    previous = product_state.get(product["url"])
+    page_text = fetch_page_text(product["url"], previous)
+    if page_text is None:
+        return unchanged_record(product, previous)
+    return page_text
 
-    while True:
-        start_index = (page_num - 1) * ITEMS_PER_PAGE + 1
-        url_to_scrape = f"{BASE_SEARCH_URL}&b={start_index}"
 
-        print(f"--- ページ {page_num} (b={start_index}) 収集 ---")
-        links = fetch_yahoo_links_playwright(url_to_scrape)
+def extract_verdict(product: dict, page_text: str) -> dict:
+    """
+    抜き出しステージ: バリエーション欄・在庫表からルールで判定する。
+    ルールで判断できなかった商品は、サイズ・在庫に関係する部分だけを抜き出し、
+    前回と同じ内容ならキャッシュの判定結果を使う。
 
-        if not links:
-            break
+    ページ内容が前回と同じ商品は、判定せずに前回の判定結果を使う。
 
-        print(f"  -> {len(links)}件発見")
-        all_product_links.update(links)
-        page_num += 1
-        time.sleep(1)
+    Returns:
+        判定レコード {"product", "judged_by", "has_size", "sizes", "content_hash"}、
+        またはAI判定待ちのレコード {"product", "snippet", "content_hash"}
+        （ページを取得できなかった商品の判定レコードは judged_by が FAILED_JUDGE で、"content_hash" を持たない）
+    """
+    if not page_text:
+        # ページを取得できなかった商品は、通知しない判定失敗として扱う（--resume で確認し直す）
+        return {"product": product, "judged_by": FAILED_JUDGE, "has_size": False, "sizes": []}
 
-    print(f"\nステップ1完了：合計 {len(all_product_links)} 件")
+    content_hash = page_content_hash(page_text)
+    previous = product_state.get(product["url"])
+    if previous is not None and previous["content_hash"] == content_hash:
+        return unchanged_record(product, previous)
 
-    print(f"\nステップ2：AIによるサイズ選定を開始します（並列処理: {MAX_WORKERS}スレッド）...")
-    recommended_links = []
-    product_list = list(all_product_links)
-    total = len(product_list)
+    rule_status, available_sizes = classify_size_availability(page_text)
+    if rule_status != UNKNOWN:
+        return {
+            "product": product,
+            "judged_by": "ルール",
+            "has_size": rule_status == AVAILABLE,
+            "sizes": available_sizes,
+            "content_hash": content_hash,
+        }
 
-    # 並列処理でチェック
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {
-            executor.submit(check_page_for_size, url, i, total): url
-            for i, url in enumerate(product_list)
+    snippet = extract_size_snippets(page_text, window_chars=SNIPPET_WINDOW_CHARS, max_chars=SNIPPET_MAX_CHARS)
+    with judge_lock:
+        prompt_chars["original"] += len(page_text)
+        prompt_chars["snippet"] += len(snippet)
+
+    cached = verdict_cache.get(snippet)
+    if cached is not None:
+        has_size, available_sizes = cached
+        return {
+            "product": product,
+            "judged_by": "キャッシュ",
+            "has_size": has_size,
+            "sizes": available_sizes,
+            "content_hash": content_hash,
         }
 
-        for future in as_completed(futures):
-            try:
-                url, has_size = future.result()
-                if has_size:
-                    recommended_links.append(url)
-            except Exception as e:
-                print(f"  [エラー] 処理失敗: {e}")
-
-    # --- ステップ3：通知 ---
-    print("\n--- ステップ3：結果の通知 ---")
-    if recommended_links:
-        print(f"{len(recommended_links)}件のアイテムが見つかりました。Discordに送信します...")
-        send_discord_notification(DISCORD_WEBHOOK_URL, recommended_links)
+    print(f"  ? ルールでは判断できないため、AIの判定待ち（{format_savings(len(page_text), len(snippet))}）:"
+          f" {product.get('title') or product['url'][:60]}")
+    return {"product": product, "snippet": snippet, "content_hash": content_hash}
+
+
+def classify_pending(records: list[dict]) -> list[dict]:
+    """AI判定ステージ: ルールで判断できなかった商品をまとめてAIに判定させ、結果をキャッシュする"""
+    by_url = {record["product"]["url"]: record for record in records}
+    ai_results = batch_classifier.classify({url: record["snippet"] for url, record in by_url.items()})
+
+    judgements = []
+    for url, (has_size, available_sizes) in ai_results.items():
+        judgement = {"product": by_url[url]["product"], "judged_by": "AI", "has_size": has_size, "sizes": available_sizes}
+        if has_size is None:
+            # API呼び出しに失敗した商品は、キャッシュ・商品の状態・ジャーナルに保存しない判定失敗として扱う
+            judgement["judged_by"] = FAILED_JUDGE
+            judgement["has_size"] = False
+        else:
+            verdict_cache.put(by_url[url]["snippet"], (has_size, available_sizes))
+            judgement["content_hash"] = by_url[url]["content_hash"]
+        judgements.append(judgement)
+    return judgements
+
+
+def record_judgement(record: dict):
+    """
+    判定結果をログに出し、判定方法ごとの件数を数え、ジャーナルに書き込む。
+    サイズがあった商品は、前回までに通知していなければ通知に回す。
+    """
+    product = record["product"]
+    has_size = record["has_size"]
+    if record["judged_by"] == FAILED_JUDGE:
+        # 判定できなかった商品はジャーナルに書かない（--resume で再開したときに確認し直す）
+        with judge_lock:
+            judge_counts[(FAILED_JUDGE, None)] += 1
+        print(f"  × 判定できませんでした（次の --resume で確認し直します）: {product.get('title') or product['url'][:60]}")
+        return
+    with judge_lock:
+        judge_counts[(record["judged_by"], has_size)] += 1
+    if record["judged_by"] != RESUMED_JUDGE:
+        journal.record_verdict(record)
+    if "content_hash" in record:
+        # ページを確認できた商品は、次の実行で変更の有無を比べるために状態を保存する
+        with judge_lock:
+            etag, last_modified = page_validators.pop(product["url"], (None, None))
+        product_state.put(
+            product["url"],
+            listing_signature=listing_signature(product),
+            content_hash=record["content_hash"],
+            has_size=has_size,
+            sizes=record["sizes"],
+            etag=etag,
+            last_modified=last_modified,
+        )
+    status = f"★ サイズあり {' '.join(record['sizes'])}".rstrip() if has_size else "- サイズなし"
+    print(f"  {status}（{record['judged_by']}で判定）: {product.get('title') or product['url'][:60]}")
+    if not has_size:
+        return
+
+    # 通知済みの商品は、新しいサイズ・値下がりがなければ件数だけ数える
+    # 通知する商品は、送る前に送信箱に書き込む（送信箱に未送信で残っていれば、送り直しの分で送られる）
+    match = {**product, "sizes": record["sizes"]}
+    if notified_index.is_new_or_changed(product_notify_key(match), match["sizes"], match.get("price")):
+        if seed_notified:
+            # 前回までの状態がない実行では、送らずに通知済みとして記録する（次の実行から変化だけを通知する）
+            notified_index.mark_notified(product_notify_key(match), match["sizes"], match.get("price"))
+            with judge_lock:
+                still_available["seeded"] += 1
+            return
+        notify_match(match)
     else:
-        print("通知対象のアイテムはありませんでした。")
+        with judge_lock:
+            still_available["products"] += 1
+
+
+def listing_priority(product: dict) -> int:
+    """
+    締め切りがあるときに、先に確認する商品の順番を決める（小さいほど先）。
+    検索結果のタイトルに書かれたサイズ・身長と、前回の判定結果から、目的のサイズがありそうな商品を優先する。
+    """
+    title = unicodedata.normalize("NFKC", product.get("title") or "")
+    score = 0
+
+    listed_years = [int(year) for year in re.findall(r"(\d{1,2})\s*(?:Y|歳)", title)]
+    if any(year in TARGET_SIZE_YEARS for year in listed_years):
+        score += 3
+    elif listed_years and max(listed_years) >= 12:
+        score += 1
+    # 14Y / 16Y に相当する身長表記（150cm / 160cm など）
+    if re.search(r"1[56]0\s*(?:cm|センチ)", title, re.IGNORECASE):
+        score += 2
+
+    previous = product_state.get(product["url"])
+    if previous is None:
+        score += 1  # まだ確認したことのない商品は、前回「なし」だった商品より先に確認する
+    elif previous["has_size"]:
+        score += 2
+    return -score
+
+
+def deadline_note(pipeline: SizeCheckPipeline) -> str | None:
+    """締め切りで止まった場合に、通知の見出しに添える「途中までの結果」の一文（止まっていなければ None）"""
+    if not pipeline.stopped_by_deadline:
+        return None
+    parts = []
+    if pipeline.discovery_cut_by_deadline:
+        parts.append("商品の収集も途中で打ち切ったため、まだ見ていない商品があります")
+    if pipeline.unchecked_count():
+        parts.append(f"見つけた商品のうち {pipeline.unchecked_count()} 件は未確認です")
+    detail = f"：{' / '.join(parts)}" if parts else ""
+    return f"⏱️ 時間切れのため途中までの結果です{detail}"
+
+
+def notify_matches(products: list[dict], note: str | None = None):
+    """
+    通知ステージの最後: まだ送っていない商品を送り、件数をまとめた見出しを送る。
+    締め切りで止まった場合は、途中までの結果であること（note）を添える。
+    --seed-notified の実行では、送らずに通知済みとして記録した件数を見出しに添える。
+    """
+    print(f"\n{len(products)}件のアイテムが見つかりました。残りの通知と見出しをDiscordに送信します...")
+    if seed_notified:
+        seeded = (f"🗂️ 前回までの通知の記録がなかったため、今回見つかった {still_available['seeded']} 件は送らずに"
+                  f"通知済みとして記録しました（次回から新しいサイズ・値下がりだけを通知します）")
+        note = f"{seeded}\n{note}" if note else seeded
+    notifier.close(note=note, still_available=still_available["products"])
+
+
+async def discover_products(base_url: str, resume_state: dict):
+    """
+    発見ステージ: 検索結果を巡回し、タイトルで対象外と分かる商品を除いて1件ずつ返す。
+    前回の実行で判定済みの商品と、掲載情報（タイトル・価格）が最近確認したときから変わっていない商品は、
+    判定レコードとして返す（ページの取得・判定をしない）。
+    """
+    skipped_products = 0
+    seen_urls = set()
+
+    def resume_or_product(product: dict) -> dict:
+        resumed = resume_state["verdicts"].get(product["url"])
+        if resumed is not None:
+            return {**resumed, "judged_by": RESUMED_JUDGE}
+
+        previous = product_state.get(product["url"])
+        if (
+            previous is not None
+            and previous["listing_signature"] == listing_signature(product)
+            and time.time() - previous["checked_at"] < LISTING_TRUST_HOURS * 60 * 60
+        ):
+            return {"product": product, "judged_by": UNCHANGED_JUDGE, "has_size": previous["has_size"], "sizes": previous["sizes"]}
+        return product
+
+    async with YahooSearchPaginator(
+        window=PAGE_WINDOW,
+        http_fetcher=http_fetcher,
+        stats=fetch_stats,
+        request_filter=request_filter,
+    ) as paginator:
+        async for product in paginator.iter_products(base_url):
+            seen_urls.add(product["url"])
+            # 検索結果のタイトルで対象外と分かる商品は、商品ページを開かない
+            if not is_size_candidate(product):
+                skipped_products += 1
+                continue
+            if product["url"] not in resume_state["discovered"]:
+                journal.record_discovered(product)
+            yield resume_or_product(product)
+
+        print(f"\n商品リンクの収集完了：合計 {len(paginator.product_index)} 件"
+              f"（タイトルで除外: {skipped_products} 件 / サイズチェックは継続中）")
+        print(f"商品リンクの重複排除: {paginator.product_index.summary()}")
+
+    # 前回見つけていたのに今回の検索結果に出てこなかった商品も、続きとして処理する
+    for url, product in resume_state["discovered"].items():
+        if url not in seen_urls:
+            yield resume_or_product(product)
+
+
+def format_judge_counts() -> str:
+    """判定方法ごとの件数をログ出力用の1行にまとめる"""
+    parts = []
+    for judged_by in ("ルール", "キャッシュ", "AI", UNCHANGED_JUDGE, RESUMED_JUDGE):
+        found = judge_counts[(judged_by, True)]
+        not_found = judge_counts[(judged_by, False)]
+        if judged_by in (UNCHANGED_JUDGE, RESUMED_JUDGE) and not found + not_found:
+            continue
+        parts.append(f"{judged_by} {found + not_found}件（あり {found} / なし {not_found}）")
+    if judge_counts[(FAILED_JUDGE, None)]:
+        parts.append(f"{FAILED_JUDGE} {judge_counts[(FAILED_JUDGE, None)]}件（再開時に確認し直す）")
+    return " / ".join(parts)
+
+# --- メイン実行 ---
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="DIESEL KIDS の 14Y / 16Y の在庫をチェックして通知する")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="前回の実行が途中で止まっていれば、判定済みの商品を飛ばして続きから再開する",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="MINUTES",
+        help="実行時間の上限（分）。有望な商品から確認し、締め切りが近づいたら新しい確認を止めて途中までの結果を通知する",
+    )
+    parser.add_argument(
+        "--flush",
+        action="store_true",
+        help="商品の確認はせず、前回までに送れなかった通知だけを送り直す",
+    )
+    parser.add_argument(
+        "--seed-notified",
+        action="store_true",
+        help="見つかった商品を送らずに通知済みとして記録するだけにする（通知済みの記録を作り直すときに、手動で指定する）",
+    )
+    args = parser.parse_args()
+    seed_notified = args.seed_notified
+
+    try:
+        notifier = build_notifier()
+    except ValueError as e:
+        print(f"エラー: 通知先の設定を読み込めませんでした。{e}")
+        print(f"（環境変数を設定するか、{NOTIFY_DESTINATIONS_FILE} を見直してください）")
+        sys.exit(2)
+    open_notification_state()
+
+    if args.flush:
+        try:
+            if resend_pending_notifications():
+                notifier.close(note="📮 前回までに送れなかった通知の再送です")
+            else:
+                print("情報: 送り直す通知はありません。")
+        finally:
+            notifier.close()
+            outbox.purge()
+            pending_notifications = count_pending_notifications()
+            outbox.close()
+            notified_index.close()
+        print(f"通知: {notifier.summary()}（{notified_index.summary()}）")
+        if pending_notifications:
+            print(f"⚠️ {pending_notifications} 件の通知がまだ送れていません。")
+            sys.exit(1)
+        sys.exit(0)
+
+    # 締め切り（通知と状態の保存に使う時間を残して、新しい確認を止める時刻）
+    deadline = None
+    if args.deadline:
+        deadline = time.monotonic() + max(0.0, args.deadline * 60 - DEADLINE_RESERVE_SECONDS)
+        print(f"締め切り: {args.deadline:g}分（残り {DEADLINE_RESERVE_SECONDS}秒 になったら新しい確認を止めます）")
+
+    BASE_SEARCH_URL = "https://shopping.yahoo.co.jp/search?p=%E3%83%87%E3%82%A3%E3%83%BC%E3%82%BC%E3%83%AB%E3%82%AD%E3%83%83%E3%82%BA+%E3%82%A2%E3%82%A6%E3%83%88%E3%83%AC%E3%83%83%E3%83%88"
+
+    print(f"商品リンクの収集・ページ取得・サイズ判定・通知をパイプラインで並行して行います"
+          f"（検索ページ: {PAGE_WINDOW} / ページ取得: {FETCH_CONCURRENCY} / AI判定: {LLM_CONCURRENCY} 並列）...")
+
+    open_check_resources()
+    resume_state = journal.start(resume=args.resume)
+    resend_pending_notifications()
+
+    pipeline = SizeCheckPipeline(
+        discover=lambda: discover_products(BASE_SEARCH_URL, resume_state),
+        fetch=fetch_product_text,
+        extract=extract_verdict,
+        classify=classify_pending,
+        on_judgement=record_judgement,
+        notify=lambda products: notify_matches(products, deadline_note(pipeline)),
+        fetch_concurrency=FETCH_CONCURRENCY,
+        extract_concurrency=EXTRACT_CONCURRENCY,
+        llm_concurrency=LLM_CONCURRENCY,
+        batch_size=LLM_BATCH_SIZE,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        # 締め切りがあるときは、目的のサイズがありそうな商品から確認する
+        priority=listing_priority if deadline else None,
+        deadline=deadline,
+    )
+    try:
+        recommended_links = asyncio.run(pipeline.run())
+        # 締め切り・商品の収集の失敗で途中までになった場合は、次の --resume で続きから確認できるよう完了にしない
+        if pipeline.discovery_failed:
+            print("⚠️ 商品の収集が途中で失敗したため、今回の実行は完了扱いにしません（--resume で続きから再開できます）。")
+        elif not pipeline.stopped_by_deadline:
+            journal.mark_completed()
+    finally:
+        notifier.close()
+        outbox.purge()
+        pending_notifications = count_pending_notifications()
+        outbox.close()
+        notified_index.close()
+        browser_pool.close()
+        http_fetcher.close()
+        verdict_cache.close()
+        journal.close()
+        product_state.close()
+
+    print(f"\nパイプライン: {pipeline.summary()}")
+    print(f"判定方法: {format_judge_counts()}")
+    if prompt_chars["original"]:
+        print(f"AIに渡すテキスト: {format_savings(prompt_chars['original'], prompt_chars['snippet'])}")
+    if batch_classifier.api_calls:
+        print(f"AI呼び出し: {batch_classifier.summary()}")
+    print(f"AI判定キャッシュ: {verdict_cache.summary()}")
+    print(f"ページ取得経路: {fetch_stats.summary()}")
+    if http_fetcher.client.rate_limited:
+        print(f"HTTPの429（リクエストが多すぎる）: {http_fetcher.client.rate_limited} 回")
+    print(f"{fetch_limiter.name}の並列度: {fetch_limiter.summary()}")
+    print(f"{llm_limiter.name}の並列度: {llm_limiter.summary()}")
+    print(f"ブラウザプール: {browser_pool.summary()}")
+    print(f"リクエストフィルタ: {request_filter.summary()}")
+    print(f"通知: {notifier.summary()}（{notified_index.summary()}）")
+    for name, destination_notifier in notifier.notifiers.items():
+        if hasattr(destination_notifier, "client"):
+            print(f"Discord Webhook（{name}）: {destination_notifier.client.summary()}")
+    print(f"通知の送信箱: {outbox.summary()}")
+    if pending_notifications:
+        print(f"⚠️ {pending_notifications} 件の通知が送れていません。次の実行、または --flush で送り直します。")
+    if not recommended_links:
+        print("\n通知対象のアイテムはありませんでした。")
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# キューの終端を表す目印
+_STOP = object()
+
+# 各ステージ間のキューに溜められる件数の既定値（上限に達すると前段の投入が待たされる）
+DEFAULT_QUEUE_SIZE = 20
+
+# AI判定のバッチが揃うのを待つ最大秒数（揃わなくてもこの秒数で判定を始める）
+DEFAULT_BATCH_WAIT_SECONDS = 2.0
+
+STAGE_NAMES = ("discover", "fetch", "extract", "classify", "notify")
+
+
+class _PriorityStageQueue(asyncio.PriorityQueue):
+    """priority(item) の小さい順に取り出すキュー（同じ優先度なら入れた順。終端の目印は最後に取り出される）"""
+
+    def __init__(self, priority):
+        super().__init__()
+        self._priority = priority
+        self._sequence = itertools.count()
+
+    def put_nowait(self, item):
+        rank = math.inf if item is _STOP else self._priority(item)
+        super().put_nowait((rank, next(self._sequence), item))
+
+    def get_nowait(self):
+        return super().get_nowait()[2]
+
+
+class SizeCheckPipeline:
+    """
+    商品の発見 → ページ取得 → ルール判定・抜き出し → AI判定 → 通知 を、
+    上限付きのキューでつないだステージとして並行に動かす非同期パイプライン。
+
+    ステージごとに同時実行数を決められる（例: ページ取得 3 / AI判定 10）。
+    後段が詰まるとキューが一杯になり、前段は空きが出るまで待たされる（バックプレッシャー）ため、
+    処理しきれない仕事が溜まり続けることはない。
+
+    各ステージの処理は呼び出し側から関数で渡す（同期関数はスレッドで実行する）:
+        discover():                     商品レコード（判定済みなら判定レコード）を返す非同期イテレータ
+        fetch(product):                 ページテキスト（前回から変更がなければ判定レコード）
+        extract(product, page_text):    判定レコード、またはAI判定待ちのレコード
+        classify(records):              AI判定待ちのレコードのリスト → 判定レコードのリスト
+        on_judgement(record):           判定レコードを1件受け取るたびに呼ばれる（見つかった商品の逐次通知など）
+        notify(products):               最後に1回、サイズがあった商品のリストで呼ばれる（残りの通知・まとめなど。
+                                        商品がなければ呼ばれないが、締め切りで止まった場合は空のリストで呼ばれる）
+
+    判定レコードは {"product", "judged_by", "has_size", "sizes"}、
+    AI判定待ちのレコードは {"product", "snippet"}（"has_size" を持たない）とする。
+
+    priority（商品レコード → 小さいほど先）を渡すと、見つけた商品を優先度の高い順に取得する
+    （順位付けのため、発見 → 取得の間のキューだけは上限なしになる）。
+    deadline（time.monotonic() の時刻）を渡すと、それを過ぎてからは新しい商品の発見・ページ取得・
+    AI判定を始めず、それまでに判定できた分だけで通知する。
+
+    使い方:
+        pipeline = SizeCheckPipeline(discover, fetch, extract, classify, on_judgement, notify)
+        matches = asyncio.run(pipeline.run())
+    """
+
+    def __init__(
+        self,
+        discover,
+        fetch,
+        extract,
+        classify,
+        on_judgement,
+        notify,
+        fetch_concurrency: int = 3,
+        extract_concurrency: int = 2,
+        llm_concurrency: int = 10,
+        batch_size: int = 8,
+        batch_wait_seconds: float = DEFAULT_BATCH_WAIT_SECONDS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        priority=None,
+        deadline: float | None = None,
+    ):
+        self.discover = discover
+        self.fetch = fetch
+        self.extract = extract
+        self.classify = classify
+        self.on_judgement = on_judgement
+        self.notify = notify
+        self.fetch_concurrency = max(1, fetch_concurrency)
+        self.extract_concurrency = max(1, extract_concurrency)
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait_seconds = batch_wait_seconds
+        self.queue_size = queue_size
+        self.priority = priority
+        self.deadline = deadline
+
+        # 統計（ステージごとの処理件数・キューに溜まった最大件数・締め切りで処理しなかった件数）
+        self.processed = Counter()
+        self.peak_queue_sizes = Counter()
+        self.skipped_by_deadline = Counter()
+        self.stopped_by_deadline = False
+        # 締め切りのため商品の発見を打ち切ったか（まだ見ていない商品は unchecked_count() に含まれない）
+        self.discovery_cut_by_deadline = False
+        # 商品の発見が例外で途中で止まったか（全件を見ていないため、完了した実行として扱わない）
+        self.discovery_failed = False
+        self.matches: list[dict] = []
+
+    async def run(self) -> list[dict]:
+        """
+        すべてのステージを起動し、最後の通知まで終わるのを待つ。
+
+        Returns:
+            サイズがあった商品のリスト
+        """
+        # 同期関数を実行するスレッドが、ステージの同時実行数の合計より少なくならないようにする
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(
+            max_workers=self.fetch_concurrency + self.extract_concurrency + self.llm_concurrency + 2,
+            thread_name_prefix="pipeline",
+        )
+        loop.set_default_executor(executor)
+
+        fetch_queue = _PriorityStageQueue(self.priority) if self.priority else self._new_queue()
+        extract_queue = self._new_queue()
+        classify_queue = self._new_queue()
+        batch_queue = self._new_queue()
+        notify_queue = self._new_queue()
+        self._queues = {
+            "fetch": fetch_queue,
+            "extract": extract_queue,
+            "classify": classify_queue,
+            "batch": batch_queue,
+            "notify": notify_queue,
+        }
+
+        async def fetch_one(product: dict):
+            if self.deadline_passed():
+                self.skipped_by_deadline["fetch"] += 1
+                return
+            result = await asyncio.to_thread(self.fetch, product)
+            self.processed["fetch"] += 1
+            # ページが前回から変わっていなければ、判定せずに前回の判定レコードを通知へ回す
+            if isinstance(result, dict) and "has_size" in result:
+                await self._put("notify", result)
+            else:
+                await self._put("extract", (product, result))
+
+        async def extract_one(item: tuple[dict, str]):
+            record = await asyncio.to_thread(self.extract, *item)
+            self.processed["extract"] += 1
+            # ルール・キャッシュで判定できたものは通知へ、できなかったものはAI判定へ
+            await self._put("notify" if "has_size" in record else "classify", record)
+
+        async def classify_batch(batch: list[dict]):
+            if self.deadline_passed():
+                self.skipped_by_deadline["classify"] += len(batch)
+                return
+            records = await asyncio.to_thread(self.classify, batch)
+            self.processed["classify"] += len(records)
+            for record in records:
+                await self._put("notify", record)
+
+        try:
+            # extract は通知にも直接流すため、notify の終端は classify が終わってから送る
+            await asyncio.gather(
+                self._discover_stage(),
+                self._worker_stage("fetch", fetch_queue, fetch_one, self.fetch_concurrency, extract_queue),
+                self._worker_stage("extract", extract_queue, extract_one, self.extract_concurrency, classify_queue),
+                self._batch_stage(classify_queue, batch_queue),
+                self._worker_stage("classify", batch_queue, classify_batch, self.llm_concurrency, notify_queue),
+                self._notify_stage(notify_queue),
+            )
+        finally:
+            executor.shutdown(wait=False)
+
+        return self.matches
+
+    def deadline_passed(self) -> bool:
+        """締め切りを過ぎたか（締め切りがなければ常に False）"""
+        if self.deadline is None or time.monotonic() < self.deadline:
+            return False
+        self.stopped_by_deadline = True
+        return True
+
+    def unchecked_count(self) -> int:
+        """
+        締め切りのため、ページ取得またはAI判定をしなかった商品の件数
+        （発見を打ち切ったために見つけていない商品は数えられない。discovery_cut_by_deadline を参照）
+        """
+        return sum(self.skipped_by_deadline.values())
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー（ステージごとの処理件数と、キューに溜まった最大件数）"""
+        counts = " → ".join(f"{name} {self.processed[name]}件" for name in STAGE_NAMES)
+        peaks = " / ".join(f"{name} {size}" for name, size in self.peak_queue_sizes.items())
+        summary = f"{counts}（キューの最大件数: {peaks or 'なし'}）"
+        if self.unchecked_count():
+            skipped = " / ".join(f"{name} {count}件" for name, count in self.skipped_by_deadline.items())
+            summary += f" / 締め切りで未処理: {skipped}"
+        return summary
+
+    def _new_queue(self) -> asyncio.Queue:
+        return asyncio.Queue(maxsize=self.queue_size)
+
+    async def _put(self, name: str, item):
+        """次のステージのキューに入れる（一杯なら空きが出るまで待つ）"""
+        stage_queue = self._queues[name]
+        await stage_queue.put(item)
+        self.peak_queue_sizes[name] = max(self.peak_queue_sizes[name], stage_queue.qsize())
+
+    async def _discover_stage(self):
+        discovered = self.discover()
+        try:
+            async for item in discovered:
+                if self.deadline_passed():
+                    self.discovery_cut_by_deadline = True
+                    print("情報: 締め切りが近いため、商品の収集を打ち切ります。")
+                    break
+                self.processed["discover"] += 1
+                # 判定レコード（前回の実行で判定済みの商品など）は、取得・判定をせずに通知へ回す
+                await self._put("notify" if "has_size" in item else "fetch", item)
+        except Exception as e:
+            self.discovery_failed = True
+            print(f"  [エラー] 商品の収集に失敗しました（ここまでに見つけた商品だけを処理します）: {e!r}")
+        finally:
+            await discovered.aclose()
+            await self._queues["fetch"].put(_STOP)
+
+    async def _worker_stage(self, name: str, inbox: asyncio.Queue, handle, concurrency: int, downstream: asyncio.Queue):
+        """inbox から取り出した項目を、最大 concurrency 件ずつ並行に handle で処理する"""
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _STOP:
+                    # 同じステージの他のワーカーにも終端を伝える
+                    await inbox.put(_STOP)
+                    return
+                try:
+                    await handle(item)
+                except Exception as e:
+                    print(f"  [エラー] {name} ステージの処理に失敗しました: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        await downstream.put(_STOP)
+
+    async def _batch_stage(self, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        """
+        AI判定待ちのレコードを batch_size 件ずつまとめる。
+        最初の1件から batch_wait_seconds 秒たっても揃わなければ、その時点の分だけで送る。
+        """
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is not None and item is not _STOP:
+                if not batch:
+                    deadline = time.monotonic() + self.batch_wait_seconds
+                batch.append(item)
+
+            if batch and (item is None or item is _STOP or len(batch) >= self.batch_size):
+                await self._put("batch", batch)
+                batch = []
+                deadline = None
+
+            if item is _STOP:
+                await outbox.put(_STOP)
+                return
+
+    async def _notify_stage(self, inbox: asyncio.Queue):
+        """判定レコードを受け取り、すべて揃ったらサイズがあった商品をまとめて通知する"""
+        while True:
+            record = await inbox.get()
+            if record is _STOP:
+                break
+            self.processed["notify"] += 1
+            self.on_judgement(record)
+            if record["has_size"]:
+                self.matches.append(record["product"])
+
+        # 締め切りで止まった場合は、サイズがあった商品がなくても途中までの結果であることを通知する
+        if self.matches or self.stopped_by_deadline:
+            await asyncio.to_thread(self.notify, self.matches)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from agents.fashion_diesel_kids.verdict_cache import normalize_page_text
+
+
+def listing_signature(product: dict) -> str:
+    """検索結果の掲載情報（タイトル・価格）から、変更の有無を比べるための署名を作る"""
+    source = "\0".join((product.get("title") or "", str(product.get("price") or "")))
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def page_content_hash(page_text: str) -> str:
+    """ページテキストの内容のハッシュ（全角・半角と空白の違いは無視する）"""
+    return hashlib.sha256(normalize_page_text(page_text).encode("utf-8")).hexdigest()
+
+
+class ProductStateStore:
+    """
+    商品ごとの前回の状態を保存するストア（SQLite）。
+
+    商品URLごとに、掲載情報の署名・ページ内容のハッシュ・判定結果・
+    ETag / Last-Modified・最後に確認した日時を持つ。
+    次の実行では、これと比べて変わっていない商品のページ取得・判定を省く。
+
+    使い方:
+        store = ProductStateStore(path)
+        previous = store.get(url)     # dict または None
+        store.put(url, listing_signature=..., content_hash=..., has_size=True, sizes=["14Y"])
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                url TEXT PRIMARY KEY,
+                listing_signature TEXT,
+                content_hash TEXT NOT NULL,
+                verdict TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                checked_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def get(self, url: str) -> dict | None:
+        """
+        前回の状態を返す。
+
+        Returns:
+            {"listing_signature", "content_hash", "has_size", "sizes", "etag", "last_modified", "checked_at"}。
+            保存されていない場合は None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                """
+                SELECT listing_signature, content_hash, verdict, etag, last_modified, checked_at
+                FROM products WHERE url = ?
+                """,
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        has_size, sizes = json.loads(row[2])
+        return {
+            "listing_signature": row[0],
+            "content_hash": row[1],
+            "has_size": bool(has_size),
+            "sizes": list(sizes),
+            "etag": row[3],
+            "last_modified": row[4],
+            "checked_at": row[5],
+        }
+
+    def put(
+        self,
+        url: str,
+        listing_signature: str | None,
+        content_hash: str,
+        has_size: bool,
+        sizes: list[str],
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ):
+        """ページを確認した結果を保存する（確認した日時は現在時刻になる）"""
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT OR REPLACE INTO products
+                    (url, listing_signature, content_hash, verdict, etag, last_modified, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (url, listing_signature, content_hash, json.dumps([bool(has_size), list(sizes)]),
+                 etag, last_modified, time.time()),
+            )
+            self._connection.commit()
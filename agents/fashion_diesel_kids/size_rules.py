@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+
+# 判定結果
+AVAILABLE = "available"  # 目的のサイズが購入できる
+UNAVAILABLE = "unavailable"  # 目的のサイズがない、またはすべて品切れ
+UNKNOWN = "unknown"  # ルールでは判断できない（AIに任せる）
+
+# 探しているサイズ
+TARGET_SIZES = ("14Y", "16Y")
+
+# サイズ表記（「14Y」「14 Y」「14歳」など）。NFKC正規化後のテキストに対して使う
+SIZE_TOKEN_PATTERN = re.compile(r"(?<![\d.])(\d{1,2})\s*(?:Y|歳|years?)(?![a-z])", re.IGNORECASE)
+
+# 品切れを表す表記
+SOLD_OUT_MARKERS = (
+    "品切れ", "品切", "在庫なし", "在庫切れ", "売り切れ", "売切れ", "完売",
+    "SOLD OUT", "SOLDOUT", "OutOfStock", "入荷待ち",
+)
+
+# 購入できることを表す表記
+AVAILABLE_MARKERS = ("在庫あり", "残りわずか", "購入可能", "InStock")
+AVAILABLE_PATTERNS = (re.compile(r"残り\s*\d+\s*[点個着]"), re.compile(r"在庫\s*[:：]?\s*[1-9]\d*"))
+
+# 在庫表の記号（サイズ表の「着丈65×身幅50」のように寸法の区切りにも使われるため、
+# サイズ表記の直後の在庫欄がこの記号だけのときに限って使う）
+SOLD_OUT_SYMBOLS = ("×", "✕")
+AVAILABLE_SYMBOLS = ("○", "〇", "◯", "△")
+
+# 在庫欄の前後に付く区切り（「14Y：×」「14Y / ○」など）
+SEGMENT_SEPARATORS = " \t:：-―/|｜()（）[]［］"
+
+# バリエーション選択欄・在庫表の1行とみなす行の最大文字数と、サイズ表記より前に置ける見出し（「サイズ:」「ブラック/」など）の最大文字数
+VARIANT_ROW_MAX_CHARS = 60
+VARIANT_ROW_MAX_PREFIX_CHARS = 12
+
+# parse_item_html が先頭に付ける埋め込みJSONの区間（商品全体の在庫状況のため、サイズごとの判定には使わない）
+STRUCTURED_DATA_START = "--- 構造化データ ---"
+STRUCTURED_DATA_END = "--- ページ本文 ---"
+
+# 構造化データのうち、サイズごとの販売情報（offers の1件）の行。parse_item_html の「販売情報: {名前} 価格=... 在庫=...」
+STRUCTURED_OFFER_PATTERN = re.compile(r"^販売情報:\s*(?P<label>.*?)\s*価格=.*?在庫=(?P<availability>\S*)$")
+STRUCTURED_AVAILABLE = ("InStock", "LimitedAvailability", "OnlineOnly")
+STRUCTURED_SOLD_OUT = ("OutOfStock", "SoldOut", "Discontinued")
+
+# 目的のサイズが1つもないとき「サイズ展開にない」とみなすのに必要な、在庫状況まで読めた他のサイズの種類数
+MIN_OTHER_SIZES_FOR_ABSENCE = 3
+
+
+def _segment_status(segment: str) -> str | None:
+    """サイズ表記の直後のテキストから、在庫の有無を読み取る（読み取れなければ None）"""
+    token = segment.strip(SEGMENT_SEPARATORS)
+    if token in SOLD_OUT_SYMBOLS:
+        return UNAVAILABLE
+    if token in AVAILABLE_SYMBOLS:
+        return AVAILABLE
+
+    upper_segment = segment.upper()
+    if any(marker.upper() in upper_segment for marker in SOLD_OUT_MARKERS):
+        return UNAVAILABLE
+    if any(marker in segment for marker in AVAILABLE_MARKERS):
+        return AVAILABLE
+    if any(pattern.search(segment) for pattern in AVAILABLE_PATTERNS):
+        return AVAILABLE
+    return None
+
+
+def _variant_rows(lines: list[str]) -> list[tuple[str, list[re.Match]]]:
+    """
+    バリエーション選択欄・在庫表の行（短く、行頭近くにサイズ表記がある行）と、その行のサイズ表記を返す。
+    商品名・説明文・関連商品の一覧など、サイズがたまたま書かれているだけの行は含めない。
+    """
+    rows = []
+    in_structured_data = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped == STRUCTURED_DATA_START:
+            in_structured_data = True
+            continue
+        if stripped == STRUCTURED_DATA_END:
+            in_structured_data = False
+            continue
+        if in_structured_data or len(stripped) > VARIANT_ROW_MAX_CHARS:
+            continue
+
+        matches = list(SIZE_TOKEN_PATTERN.finditer(stripped))
+        if not matches:
+            continue
+        prefix = stripped[:matches[0].start()]
+        if len(prefix) > VARIANT_ROW_MAX_PREFIX_CHARS or re.search(r"\d", prefix):
+            continue
+        rows.append((stripped, matches))
+    return rows
+
+
+def _structured_offer_statuses(lines: list[str]) -> list[tuple[int, str | None]]:
+    """
+    構造化データの販売情報のうち、名前にサイズ表記があるもの（バリエーションごとの offers）の
+    (サイズの年齢, 在庫の有無) を返す。名前のない販売情報は商品全体の在庫状況なので含めない。
+    """
+    statuses = []
+    in_structured_data = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped == STRUCTURED_DATA_START:
+            in_structured_data = True
+            continue
+        if stripped == STRUCTURED_DATA_END:
+            break
+        if not in_structured_data:
+            continue
+
+        offer = STRUCTURED_OFFER_PATTERN.match(stripped)
+        if offer is None:
+            continue
+        sizes = SIZE_TOKEN_PATTERN.findall(offer.group("label"))
+        if len(sizes) != 1:
+            continue
+        availability = offer.group("availability")
+        if availability in STRUCTURED_AVAILABLE:
+            status = AVAILABLE
+        elif availability in STRUCTURED_SOLD_OUT:
+            status = UNAVAILABLE
+        else:
+            status = None
+        statuses.append((int(sizes[0]), status))
+    return statuses
+
+
+def classify_size_availability(page_text: str) -> tuple[str, list[str]]:
+    """
+    商品ページのテキストから、14Y / 16Y の在庫をルールで判定する。
+
+    バリエーション選択欄や在庫表では「14Y 在庫あり」「16Y ×」のように
+    サイズと在庫表記が同じ行に並ぶため、そうした行だけを対象に、サイズ表記ごとに
+    次のサイズ表記（または行末）までをそのサイズの在庫欄として読む。
+    構造化データは、名前にサイズ表記がある販売情報（サイズごとの offers）だけを使う。
+    別の行の表記や、商品全体の在庫状況はサイズごとの判定に使わない。
+
+    目的サイズの表記がない場合に「サイズ展開にない」とするのは、他のサイズの在庫状況が読める
+    （バリエーション選択欄・在庫表がある）ときだけ。関連商品やサイズ表にサイズが並んでいるだけなら AI に任せる。
+
+    Returns:
+        (判定結果, 購入できる目的サイズのリスト)。判定結果は AVAILABLE / UNAVAILABLE / UNKNOWN
+    """
+    if not page_text:
+        return UNKNOWN, []
+
+    lines = unicodedata.normalize("NFKC", page_text).splitlines()
+    target_years = {int(size.rstrip("Y")) for size in TARGET_SIZES}
+
+    available_sizes = set()
+    target_statuses = []
+    other_stocked_sizes = set()
+
+    size_statuses = _structured_offer_statuses(lines)
+    for line, matches in _variant_rows(lines):
+        for position, match in enumerate(matches):
+            end = matches[position + 1].start() if position + 1 < len(matches) else len(line)
+            size_statuses.append((int(match.group(1)), _segment_status(line[match.end():end])))
+
+    for year, status in size_statuses:
+        if year not in target_years:
+            if status is not None:
+                other_stocked_sizes.add(year)
+            continue
+        target_statuses.append(status)
+        if status == AVAILABLE:
+            available_sizes.add(f"{year}Y")
+
+    if available_sizes:
+        return AVAILABLE, sorted(available_sizes)
+
+    # 目的サイズの表記がすべて品切れなら「なし」
+    if target_statuses and all(status == UNAVAILABLE for status in target_statuses):
+        return UNAVAILABLE, []
+
+    # 目的サイズの表記が1つもなく、在庫状況の読める他のサイズが十分並んでいれば「サイズ展開にない」
+    if not target_statuses and len(other_stocked_sizes) >= MIN_OTHER_SIZES_FOR_ABSENCE:
+        return UNAVAILABLE, []
+
+    return UNKNOWN, []
@@ -0,0 +1,77 @@
+import re
+import unicodedata
+
+# サイズ・在庫の記載を探すためのキーワード
+SIZE_KEYWORDS = ("サイズ", "SIZE", "14Y", "16Y", "在庫", "品切れ", "売り切れ", "バリエーション", "InStock", "OutOfStock")
+
+# 目的のサイズそのもの（上限を超えるときはこれを含む範囲を優先して残す）
+PRIORITY_KEYWORDS = ("14Y", "16Y")
+
+# キーワードの前後に含める文字数と、抜き出したテキスト全体の上限
+DEFAULT_WINDOW_CHARS = 300
+DEFAULT_MAX_CHARS = 4000
+
+SNIPPET_SEPARATOR = "\n…\n"
+
+
+def _keyword_pattern(keywords: tuple[str, ...]) -> re.Pattern:
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+
+
+def _merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """重なっている・接している範囲をまとめる"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def extract_size_snippets(
+    page_text: str,
+    keywords: tuple[str, ...] = SIZE_KEYWORDS,
+    window_chars: int = DEFAULT_WINDOW_CHARS,
+    max_chars: int = DEFAULT_MAX_CHARS,
+) -> str:
+    """
+    商品ページのテキストから、サイズ・在庫に関係する部分だけを抜き出す。
+
+    キーワードの前後 window_chars 文字ずつを切り出し、重なる範囲はまとめて、
+    ページ内の順番のまま「…」でつなぐ。合計が max_chars を超える場合は、
+    目的のサイズ（14Y / 16Y）を含む範囲を優先して残す。
+    キーワードが1つも見つからない場合は、先頭から max_chars 文字を返す。
+    """
+    text = unicodedata.normalize("NFKC", page_text)
+
+    ranges = [
+        (max(0, match.start() - window_chars), min(len(text), match.end() + window_chars))
+        for match in _keyword_pattern(keywords).finditer(text)
+    ]
+    if not ranges:
+        return text[:max_chars]
+
+    merged = _merge_ranges(ranges)
+
+    # 目的サイズを含む範囲 → それ以外の順に、上限に収まるだけ選ぶ
+    priority_pattern = _keyword_pattern(PRIORITY_KEYWORDS)
+    ordered = sorted(merged, key=lambda span: priority_pattern.search(text, span[0], span[1]) is None)
+
+    selected = []
+    used_chars = 0
+    for start, end in ordered:
+        remaining = max_chars - used_chars
+        if remaining <= 0:
+            break
+        end = min(end, start + remaining)
+        selected.append((start, end))
+        used_chars += end - start + len(SNIPPET_SEPARATOR)
+
+    return SNIPPET_SEPARATOR.join(text[start:end].strip() for start, end in sorted(selected))
+
+
+def format_savings(original_length: int, snippet_length: int) -> str:
+    """抜き出しで減った文字数をログ出力用の文字列にする"""
+    reduction = (1 - snippet_length / original_length) * 100 if original_length else 0.0
+    return f"{original_length} → {snippet_length} 文字（-{reduction:.0f}%）"
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# 既定の有効期限（秒）と最大件数
+DEFAULT_TTL_SECONDS = 14 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def normalize_page_text(page_text: str) -> str:
+    """キャッシュキー用にテキストを正規化する（全角・半角と空白の違いを無視）"""
+    return " ".join(unicodedata.normalize("NFKC", page_text).split())
+
+
+class VerdictCache:
+    """
+    AIの判定結果を、ページテキストの内容をキーにして保存するキャッシュ（SQLite）。
+
+    キーは「正規化したページテキスト・プロンプトのバージョン・モデル名」のハッシュなので、
+    ページの内容・プロンプト・モデルのどれかが変われば自動的に別のキーになる。
+    有効期限（TTL）を過ぎたものは使わず、件数が上限を超えたら最後に使った日時が古いものから消す。
+
+    使い方:
+        cache = VerdictCache(path, model_name="gemini-2.5-flash", prompt_version="size-v1")
+        verdict = cache.get(page_text)        # (在庫あり?, サイズのリスト) または None
+        cache.put(page_text, (True, ["14Y"]))
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        prompt_version: str,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                verdict TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS verdicts_last_access ON verdicts (last_access)")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def key_for(self, page_text: str) -> str:
+        """ページテキスト・プロンプトのバージョン・モデル名からキャッシュキーを作る"""
+        source = "\0".join((self.model_name, self.prompt_version, normalize_page_text(page_text)))
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def get(self, page_text: str) -> tuple[bool, list[str]] | None:
+        """
+        キャッシュ済みの判定結果を返す。
+
+        Returns:
+            (目的サイズが購入可能か, 購入可能なサイズのリスト)。キャッシュにない・期限切れの場合は None
+        """
+        key = self.key_for(page_text)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT verdict, created_at FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE verdicts SET last_access = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+
+        has_size, sizes = json.loads(row[0])
+        return bool(has_size), list(sizes)
+
+    def put(self, page_text: str, verdict: tuple[bool, list[str]]):
+        """判定結果を保存し、上限を超えた分を古い順に消す"""
+        key = self.key_for(page_text)
+        now = time.time()
+        has_size, sizes = verdict
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps([bool(has_size), list(sizes)]), now, now),
+            )
+            self._connection.execute(
+                """
+                DELETE FROM verdicts WHERE key IN (
+                    SELECT key FROM verdicts ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._connection.commit()
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        return f"ヒット {self.hits} 件 / ミス {self.misses} 件（ヒット率 {hit_rate:.0f}%）"
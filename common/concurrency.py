@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+
+# 過負荷（同時実行数を下げるべき）とみなすHTTPステータス
+OVERLOAD_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 過負荷とみなす例外のクラス名（requests / google-api-core / Playwright などの型を import せずに判定する）
+OVERLOAD_ERROR_NAMES = (
+    "Timeout", "TimeoutError", "ReadTimeout", "ConnectTimeout", "RetryError", "MaxRetryError",
+    "TooManyRequests", "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+)
+
+
+def is_overload_error(error: Exception) -> bool:
+    """例外が「相手が混んでいる」ことを表すか（タイムアウト・429・5xx）"""
+    for error_type in type(error).__mro__:
+        if any(name in error_type.__name__ for name in OVERLOAD_ERROR_NAMES):
+            return True
+
+    # ステータスコードを持つ例外（requests.HTTPError の response、google-api-core の code など）
+    response = getattr(error, "response", None)
+    for status in (getattr(error, "code", None), getattr(error, "status_code", None), getattr(response, "status_code", None)):
+        if isinstance(status, int) and status in OVERLOAD_STATUS_CODES:
+            return True
+
+    message = str(error)
+    return "429" in message or "Resource has been exhausted" in message
+
+
+class _Slot:
+    """AdaptiveLimiter.slot() の中で、結果を報告するためのオブジェクト"""
+
+    def __init__(self):
+        self.overloaded = False
+
+    def mark_overloaded(self):
+        """例外にならない過負荷（429 / 5xx のレスポンスなど）を報告する"""
+        self.overloaded = True
+
+
+class AdaptiveLimiter:
+    """
+    応答の様子を見ながら同時実行数を自動で上げ下げするリミッタ（AIMD方式）。
+
+    - 成功が現在の同時実行数の分だけ続いたら、同時実行数を1つ上げる（加算的な増加）
+    - タイムアウト・429・5xx が返ったら、同時実行数を decrease_factor 倍に下げる（乗算的な減少）
+      （同時に実行中だった呼び出しがまとめて失敗しても下げすぎないよう、cooldown_seconds の間は1回だけ）
+    - latency_target を超えて遅い応答と、過負荷以外のエラーは、それまでの順調な連続をリセットする
+      （応答の速さとエラーの割合がどちらも健全な間だけ上げる）
+
+    同時実行数が変わるたびにログを出し、推移は summary() で確認できる。
+    複数スレッドから同時に使ってよい。
+
+    使い方:
+        limiter = AdaptiveLimiter("fetch", initial=3, max_limit=8)
+        with limiter.slot() as slot:
+            response = session.get(url)
+            if response.status_code == 429:
+                slot.mark_overloaded()
+
+        result = limiter.call(model.generate_content, prompt)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 2,
+        min_limit: int = 1,
+        max_limit: int = 10,
+        decrease_factor: float = 0.5,
+        latency_target: float | None = None,
+        cooldown_seconds: float = 5.0,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.cooldown_seconds = cooldown_seconds
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._healthy_streak = 0
+        self._last_decrease = float("-inf")
+        self._started = time.monotonic()
+
+        # 統計（成功・過負荷・その他のエラー・latency_target を超えた成功の件数と、同時実行数の推移）
+        self.successes = 0
+        self.overloads = 0
+        self.errors = 0
+        self.slow_responses = 0
+        self.history: list[tuple[float, int]] = [(0.0, self.limit)]
+
+    @contextmanager
+    def slot(self):
+        """同時実行数に空きが出るまで待ってから、1件分の実行枠を確保する"""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+        slot = _Slot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except Exception as e:
+            self._release(time.monotonic() - started, overloaded=is_overload_error(e), failed=True)
+            raise
+        else:
+            self._release(time.monotonic() - started, overloaded=slot.overloaded, failed=slot.overloaded)
+
+    def call(self, func, *args, **kwargs):
+        """func を実行枠の中で呼び出す（例外はそのまま呼び出し側に返す）"""
+        with self.slot():
+            return func(*args, **kwargs)
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー（同時実行数の推移と、結果ごとの件数）"""
+        limits = [limit for _, limit in self.history]
+        timeline = " → ".join(str(limit) for limit in limits[-20:])
+        if len(limits) > 20:
+            timeline = "… → " + timeline
+        summary = (
+            f"同時実行数 {timeline}（最小 {min(limits)} / 最大 {max(limits)}）"
+            f" / 成功 {self.successes} 件 / 過負荷 {self.overloads} 件 / その他のエラー {self.errors} 件"
+        )
+        if self.latency_target is not None:
+            summary += f" / {self.latency_target:g}秒を超えた応答 {self.slow_responses} 件"
+        return summary
+
+    def _release(self, latency: float, overloaded: bool, failed: bool):
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+
+            if overloaded:
+                self.overloads += 1
+                self._healthy_streak = 0
+                if now - self._last_decrease >= self.cooldown_seconds:
+                    self._last_decrease = now
+                    self._set_limit(max(self.min_limit, int(self.limit * self.decrease_factor)), "過負荷のため減少")
+            elif failed:
+                self.errors += 1
+                self._healthy_streak = 0
+            else:
+                self.successes += 1
+                if self.latency_target is not None and latency > self.latency_target:
+                    self.slow_responses += 1
+                    self._healthy_streak = 0
+                else:
+                    self._healthy_streak += 1
+                    if self._healthy_streak >= self.limit and self.limit < self.max_limit:
+                        self._healthy_streak = 0
+                        self._set_limit(self.limit + 1, "順調なため増加")
+
+            self._condition.notify_all()
+
+    def _set_limit(self, new_limit: int, reason: str):
+        if new_limit == self.limit:
+            return
+        elapsed = time.monotonic() - self._started
+        print(f"  [並列度] {self.name}: {self.limit} → {new_limit}（{reason} / {elapsed:.0f}秒経過）")
+        self.limit = new_limit
+        self.history.append((elapsed, new_limit))
+
+
+class LimitedClient:
+    """
+    オブジェクトの指定したメソッドの呼び出しを、AdaptiveLimiter の実行枠の中で行うラッパー。
+    それ以外の属性はそのまま元のオブジェクトのものを返す。
+
+    使い方:
+        limited_model = LimitedClient(model, limiter, methods=("generate_content",))
+        response = limited_model.generate_content(prompt)
+    """
+
+    def __init__(self, target, limiter: AdaptiveLimiter, methods: tuple[str, ...]):
+        self._target = target
+        self._limiter = limiter
+        self._methods = set(methods)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if name not in self._methods:
+            return attribute
+
+        def limited(*args, **kwargs):
+            return self._limiter.call(attribute, *args, **kwargs)
+
+        return limited
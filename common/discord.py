@@ -1,11 +1,220 @@
+from __future__ import annotations
+
 import requests
-import json
+import random
+import threading
+import time
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse, parse_qs
 
-def extract_product_info(url: str) -> dict:
+# Discordの制限（1メッセージあたりのembedの数と合計文字数、各項目の文字数）
+EMBEDS_PER_MESSAGE = 10
+EMBED_TOTAL_CHARS = 6000
+EMBED_TITLE_CHARS = 256
+EMBED_DESCRIPTION_CHARS = 4096
+EMBED_FOOTER_CHARS = 2048
+
+# コンパクト表示（リンクの一覧）のときに、1回の送信にまとめる商品数と、1行に載せる商品名の文字数
+# （1行はおよそ130文字になるため、6000文字の1メッセージに40件前後入る）
+LINKS_PER_MESSAGE = 40
+LINK_TITLE_CHARS = 40
+
+HEADER_TITLE = "🎉 **DIESEL KIDS アウトレット**"
+
+
+def format_still_available(count: int) -> str:
+    """前回までに通知済みで、今回も在庫があった商品の件数の1行"""
+    return f"📌 引き続き在庫あり（通知済みのため省略）: {count}件"
+
+
+class DiscordWebhookClient:
     """
-    Yahoo!ショッピングのURLから商品情報を抽出する
+    Discord Webhookへの送信クライアント（コネクションプール・レート制限対応）。
+
+    - requests.Session を使い回して接続を再利用する
+    - レスポンスの X-RateLimit-* ヘッダーからバケットごとの残り回数とリセットまでの時間を覚え、
+      残りが0のバケットにはリセットまで待ってから送る
+    - 429 が返ったら Retry-After（またはレスポンスの retry_after）だけ待って送り直す
+      （global の制限なら、すべてのWebhookへの送信を待たせる）
+    - 通信エラー・5xx は、ゆらぎ（ジッター）付きの指数バックオフで max_retries 回まで送り直す
+
+    複数スレッドから同時に使ってよい。
+
+    使い方:
+        client = DiscordWebhookClient()
+        client.post(webhook_url, {"content": "..."})
     """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        timeout: float = 15.0,
+        pool_size: int = 4,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        # Webhook URL → バケットID、バケットID → (残り回数, リセットされる時刻)
+        self._route_buckets: dict[str, str] = {}
+        self._buckets: dict[str, tuple[int, float]] = {}
+        self._global_reset_at = 0.0
+
+        # 統計（送れたメッセージ数・送れなかったメッセージ数・送り直した回数・レート制限で待った秒数）
+        self.messages_sent = 0
+        self.messages_failed = 0
+        self.retries = 0
+        self.rate_limit_wait_seconds = 0.0
+
+    def close(self):
+        """プール中の接続をすべて閉じる"""
+        self.session.close()
+
+    def post(self, webhook_url: str, payload: dict) -> bool:
+        """
+        メッセージを1件送る。レート制限・一時的なエラーの間は待って送り直す。
+
+        Returns:
+            送れたら True。送り直しても送れなかった場合や、送り直しても直らないエラー（400 など）の場合は False
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+            self._wait_for_rate_limit(webhook_url)
+
+            try:
+                response = self.session.post(webhook_url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"  [Discord] 送信エラー（{attempt + 1}回目）: {e}")
+                self._sleep(self._backoff(attempt))
+                continue
+
+            self._update_bucket(webhook_url, response.headers)
+
+            if response.status_code == 429:
+                retry_after = self._retry_after(response)
+                print(f"  [Discord] レート制限のため {retry_after:.1f}秒 待ってから送り直します")
+                if response.headers.get("X-RateLimit-Global") or response.headers.get("X-RateLimit-Scope") == "global":
+                    with self._lock:
+                        self._global_reset_at = max(self._global_reset_at, time.monotonic() + retry_after)
+                self._sleep(retry_after + random.uniform(0, 0.5))
+                continue
+
+            if response.status_code >= 500:
+                print(f"  [Discord] サーバーエラー {response.status_code}（{attempt + 1}回目）")
+                self._sleep(self._backoff(attempt))
+                continue
+
+            if response.ok:
+                self._count("messages_sent")
+                return True
+
+            # 400（メッセージの形式の誤り）・401 / 404（Webhookが無効）などは送り直しても直らない
+            print(f"  [Discord] 送信できませんでした: ステータス {response.status_code} - {response.text[:200]}")
+            break
+
+        self._count("messages_failed")
+        return False
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        return (
+            f"送信 {self.messages_sent} 件 / 失敗 {self.messages_failed} 件"
+            f" / 再送 {self.retries} 回 / レート制限の待ち {self.rate_limit_wait_seconds:.1f}秒"
+        )
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _backoff(self, attempt: int) -> float:
+        """指数バックオフの待ち時間（0〜上限のあいだでランダムにずらす）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _sleep(seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        """429 のレスポンスから、送り直すまでの秒数を読み取る"""
+        try:
+            return float(response.json()["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            pass
+        try:
+            return float(response.headers.get("Retry-After", 1.0))
+        except ValueError:
+            return 1.0
+
+    def _update_bucket(self, webhook_url: str, headers):
+        """X-RateLimit-* ヘッダーから、バケットの残り回数とリセットされる時刻を覚える"""
+        bucket = headers.get("X-RateLimit-Bucket")
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if bucket is None or remaining is None or reset_after is None:
+            return
+        try:
+            state = (int(remaining), time.monotonic() + float(reset_after))
+        except ValueError:
+            return
+        with self._lock:
+            self._route_buckets[webhook_url] = bucket
+            self._buckets[bucket] = state
+
+    def _wait_for_rate_limit(self, webhook_url: str):
+        """このWebhookのバケットの残りが0なら、リセットされるまで待つ"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._global_reset_at - now
+            bucket = self._route_buckets.get(webhook_url)
+            if bucket is not None:
+                remaining, reset_at = self._buckets[bucket]
+                if remaining <= 0:
+                    wait = max(wait, reset_at - now)
+                    # 待ったあとは1回分だけ送れるとみなす（実際の残り回数は次のレスポンスで分かる）
+                    self._buckets[bucket] = (1, reset_at)
+                else:
+                    self._buckets[bucket] = (remaining - 1, reset_at)
+            if wait > 0:
+                self.rate_limit_wait_seconds += wait
+        self._sleep(wait)
+
+
+# 通知関数が共通で使うクライアント（接続とレート制限の状態を共有する）
+default_webhook_client = DiscordWebhookClient()
+
+
+def extract_product_info(item: str | dict) -> dict:
+    """
+    通知する商品の情報を取り出す。
+
+    検索結果から取得した商品レコード（url, title, price, store, thumbnail を持つ辞書）なら
+    その値を使い、URLの文字列だけの場合はYahoo!ショッピングのURLから推測する。
+    """
+    if isinstance(item, dict):
+        url = item.get("url", "")
+        product_id = urlparse(url).path.strip('/').split('/')[-1] or "unknown"
+        return {
+            "title": item.get("title") or f"商品 {product_id[:20]}",
+            "url": url,
+            "product_id": product_id,
+            "price": item.get("price"),
+            "store": item.get("store", ""),
+            "thumbnail": item.get("thumbnail", ""),
+        }
+
+    url = item
     try:
         parsed = urlparse(url)
         # 商品IDを取得（URLの最後の部分）
@@ -28,42 +237,219 @@ def extract_product_info(url: str) -> dict:
             "product_id": "unknown"
         }
 
-def send_discord_notification(webhook_url: str, items: list[str]):
+def _truncate(text: str, limit: int) -> str:
+    """limit 文字に収まるように末尾を「…」で切り詰める"""
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def build_product_embed(item: str | dict, number: int, total: int | None = None) -> dict:
     """
-    商品のURLリストを受け取り、Embedsを使用してDiscordに通知を送る関数
-    1メッセージあたり最大10個のembedsを送信し、それを超える場合は複数メッセージに分割
+    1商品分のembedを作る（各項目はDiscordの文字数の上限に収める）。
+
+    Args:
+        item: 商品URL、または商品レコード
+        number: 通知全体での通し番号（1から）
+        total: 通知する商品の総数（ストリーミング通知などで分からない場合は None）
+    """
+    product_info = extract_product_info(item)
+    position = f"{number}/{total}" if total else f"#{number}"
+
+    footer = f"DIESEL KIDS アウトレット | {position}"
+    if product_info.get("store"):
+        footer += f" | {product_info['store']}"
+
+    embed = {
+        # 検索結果から商品名が取れていない場合は、URLから推測した名前になる
+        "title": _truncate(f"🛍️ {product_info['title']}", EMBED_TITLE_CHARS),
+        "url": product_info["url"],
+        "color": 0x00A0DC,  # DIESELブランドカラー（青系）
+        "footer": {"text": _truncate(footer, EMBED_FOOTER_CHARS)},
+    }
+
+    # 価格・サイズ・画像が取れている場合は表示する
+    description = []
+    if product_info.get("price"):
+        description.append(f"💴 ¥{product_info['price']:,}")
+    if isinstance(item, dict) and item.get("sizes"):
+        description.append(f"📏 {' / '.join(item['sizes'])}")
+    if description:
+        embed["description"] = "\n".join(description)
+    if product_info.get("thumbnail"):
+        embed["thumbnail"] = {"url": product_info["thumbnail"]}
+    return embed
+
+
+def format_link_line(item: str | dict, number: int) -> str:
+    """コンパクト表示の1行（「番号. [商品名](URL) ¥価格 サイズ」。商品名は短く切り詰める）"""
+    product_info = extract_product_info(item)
+    line = f"{number}. [{_truncate(product_info['title'], LINK_TITLE_CHARS)}]({product_info['url']})"
+    if product_info.get("price"):
+        line += f" ¥{product_info['price']:,}"
+    if isinstance(item, dict) and item.get("sizes"):
+        line += f" {'/'.join(item['sizes'])}"
+    return line
+
+
+def build_link_list_messages(items: list[str | dict], start_number: int = 1) -> list[list[dict]]:
+    """
+    コンパクト表示用に、商品を1行ずつのリンクの一覧にして、メッセージごとのembedのリストを作る。
+
+    1メッセージのembedの合計（6000文字）まで行を詰め、1つのembedの説明文の上限（4096文字）を
+    超える分は、同じメッセージの次のembedに続ける。
+    """
+    messages = []
+    embeds = []
+    lines = []
+    embed_chars = 0
+    message_chars = 0
+    for number, item in enumerate(items, start=start_number):
+        line = format_link_line(item, number)
+        added = len(line) + (1 if lines else 0)
+
+        if message_chars + added > EMBED_TOTAL_CHARS and (lines or embeds):
+            if lines:
+                embeds.append({"description": "\n".join(lines), "color": 0x00A0DC})
+            messages.append(embeds)
+            embeds, lines = [], []
+            embed_chars = message_chars = 0
+            added = len(line)
+        elif embed_chars + added > EMBED_DESCRIPTION_CHARS and lines:
+            embeds.append({"description": "\n".join(lines), "color": 0x00A0DC})
+            lines = []
+            embed_chars = 0
+            added = len(line)
+
+        lines.append(line)
+        embed_chars += added
+        message_chars += added
+
+    if lines:
+        embeds.append({"description": "\n".join(lines), "color": 0x00A0DC})
+    if embeds:
+        messages.append(embeds)
+    return messages
+
+
+def embed_length(embed: dict) -> int:
+    """Discordの「1メッセージのembedの合計6000文字」の制限で数えられる文字数"""
+    length = len(embed.get("title", "")) + len(embed.get("description", ""))
+    length += len(embed.get("footer", {}).get("text", "")) + len(embed.get("author", {}).get("name", ""))
+    for field in embed.get("fields", []):
+        length += len(field.get("name", "")) + len(field.get("value", ""))
+    return length
+
+
+def shrink_embed(embed: dict, limit: int) -> dict | None:
+    """
+    embedの文字数が limit 以下になるまで、なくても困らない項目から順に削る
+    （フッター → 説明文（価格・サイズ）→ タイトルの切り詰め）。
+    リンクの一覧のembedなど、削っても収まらない場合は None を返す。
+    """
+    shrunk = dict(embed)
+    for optional in ("footer", "description"):
+        if embed_length(shrunk) <= limit:
+            return shrunk
+        if optional == "description" and "title" not in shrunk:
+            return None  # 説明文が本体のembed（リンクの一覧）は削れない
+        shrunk.pop(optional, None)
+
+    if embed_length(shrunk) <= limit:
+        return shrunk
+    if "title" in shrunk and limit >= 2:
+        shrunk["title"] = _truncate(shrunk["title"], limit)
+        return shrunk
+    return None
+
+
+def pack_embeds(embeds: list[dict]) -> list[list[dict]]:
+    """
+    embedを、1メッセージあたりの上限（10個・合計6000文字）を超えないように詰めて、メッセージごとに分ける。
+
+    今のメッセージに収まらないembedは、なくても困らない項目を削れば収まる場合は削って今のメッセージに入れ、
+    それでも収まらない場合は次のメッセージに回す（メッセージの数を減らすため）。
+    """
+    messages = []
+    current = []
+    used = 0
+    for embed in embeds:
+        length = embed_length(embed)
+        if current and (len(current) >= EMBEDS_PER_MESSAGE or used + length > EMBED_TOTAL_CHARS):
+            shrunk = None
+            if len(current) < EMBEDS_PER_MESSAGE:
+                shrunk = shrink_embed(embed, EMBED_TOTAL_CHARS - used)
+            if shrunk is not None:
+                current.append(shrunk)
+                used += embed_length(shrunk)
+                continue
+            messages.append(current)
+            current = []
+            used = 0
+
+        if length > EMBED_TOTAL_CHARS:
+            embed = shrink_embed(embed, EMBED_TOTAL_CHARS) or embed
+        current.append(embed)
+        used += embed_length(embed)
+
+    if current:
+        messages.append(current)
+    return messages
+
+
+def build_message_embeds(items: list[str | dict], start_number: int = 1, total: int | None = None, compact: bool = False) -> list[list[dict]]:
+    """商品のリストから、メッセージごとに詰めたembedのリストを作る（compact ならリンクの一覧）"""
+    if compact:
+        return build_link_list_messages(items, start_number)
+    embeds = [build_product_embed(item, number, total) for number, item in enumerate(items, start=start_number)]
+    return pack_embeds(embeds)
+
+
+def post_discord_message(webhook_url: str, payload: dict, client: DiscordWebhookClient | None = None) -> bool:
+    """Webhookにメッセージを1件送る（レート制限・一時的なエラーは待って送り直す。成功したら True）"""
+    if (client or default_webhook_client).post(webhook_url, payload):
+        return True
+    print("❌ Discordへの通知に失敗しました")
+    return False
+
+
+def send_discord_notification(
+    webhook_url: str,
+    items: list[str | dict],
+    note: str | None = None,
+    still_available: int = 0,
+    client: DiscordWebhookClient | None = None,
+    compact: bool = False,
+):
+    """
+    商品のURLリスト（または商品レコードのリスト）を受け取り、Embedsを使用してDiscordに通知を送る関数
+    1メッセージの上限（10個のembeds・合計6000文字）まで詰めて送り、それを超える場合は複数メッセージに分割
+    compact なら商品ごとのembedではなくリンクの一覧にする（1メッセージに30件以上入る）
+    note を渡すと、最初のメッセージの見出しの下に添える（途中までの結果であることの注意書きなど）
+    still_available に通知済みのため省いた商品の件数を渡すと、見出しに1行で添える
+    送れなかったメッセージがあっても、残りのメッセージは送る
     """
     if not items:
+        if still_available:
+            content = f"{HEADER_TITLE} - 新着の商品はありませんでした\n{format_still_available(still_available)}"
+            if post_discord_message(webhook_url, {"content": content}, client):
+                print(f"✅ 通知済みの商品の件数を送信しました (合計 {still_available}件)")
+            return
         print("通知対象のアイテムがありません。")
         return
 
-    # 10件ずつに分割（Discordの制限: 1メッセージあたり最大10 embeds）
-    EMBEDS_PER_MESSAGE = 10
+    # 1メッセージの上限（10 embeds・合計6000文字）に収まるように詰める
     total_items = len(items)
+    messages = build_message_embeds(items, total=total_items, compact=compact)
+    total_batches = len(messages)
+    failed_batches = []
 
-    for batch_index in range(0, total_items, EMBEDS_PER_MESSAGE):
-        batch = items[batch_index:batch_index + EMBEDS_PER_MESSAGE]
-        batch_num = (batch_index // EMBEDS_PER_MESSAGE) + 1
-        total_batches = (total_items + EMBEDS_PER_MESSAGE - 1) // EMBEDS_PER_MESSAGE
-
-        # Embedsの作成
-        embeds = []
-        for idx, url in enumerate(batch, start=1):
-            product_info = extract_product_info(url)
-
-            embed = {
-                "title": f"🛍️ 商品 {batch_index + idx}",
-                "url": url,
-                "color": 0x00A0DC,  # DIESELブランドカラー（青系）
-                "footer": {
-                    "text": f"DIESEL KIDS アウトレット | {batch_index + idx}/{total_items}"
-                }
-            }
-            embeds.append(embed)
-
+    for batch_num, embeds in enumerate(messages, start=1):
         # メッセージコンテンツ（最初のバッチのみ）
-        if batch_index == 0:
-            content = f"🎉 **DIESEL KIDS アウトレット** - {total_items}件の商品が見つかりました！✨"
+        if batch_num == 1:
+            content = f"{HEADER_TITLE} - {total_items}件の商品が見つかりました！✨"
+            if still_available:
+                content += f"\n{format_still_available(still_available)}"
+            if note:
+                content += f"\n{note}"
         else:
             content = f"📦 続き ({batch_num}/{total_batches})"
 
@@ -72,14 +458,151 @@ def send_discord_notification(webhook_url: str, items: list[str]):
             "content": content,
             "embeds": embeds
         }
-        headers = {"Content-Type": "application/json"}
-
-        try:
-            response = requests.post(webhook_url, data=json.dumps(payload), headers=headers)
-            response.raise_for_status()
+        if post_discord_message(webhook_url, payload, client):
             print(f"✅ Discordへの通知に成功しました！ (バッチ {batch_num}/{total_batches})")
-        except Exception as e:
-            print(f"❌ Discordへの通知に失敗しました (バッチ {batch_num}): {e}")
-            return  # エラーが発生したら以降の送信を中止
+        else:
+            failed_batches.append(batch_num)
+
+    if failed_batches:
+        print(f"⚠️ 一部のメッセージを送れませんでした (バッチ {', '.join(map(str, failed_batches))} / 全{total_batches}バッチ)")
+    else:
+        print(f"✅ すべての通知が完了しました！ (合計 {total_items}件)")
+
+
+class StreamingDiscordNotifier:
+    """
+    見つかった商品を、全件の確認を待たずに少しずつDiscordへ送る通知クラス。
+
+    add() で受け取った商品を溜めておき、1メッセージ分（10件、compact なら LINKS_PER_MESSAGE 件）揃うか、
+    最初の1件を受け取ってから max_latency_seconds 秒たった時点で送る。
+    送信はバックグラウンドのスレッドで行うため、add() は待たされない。
+    close() で残りを送り、最後に件数をまとめた見出しのメッセージを送る。
+    on_sent を渡すと、メッセージを送れるたびにその商品のリストで呼ぶ（通知済みの記録など）。
+    on_failed を渡すと、送れなかった商品のリストで呼ぶ（送信箱に失敗を記録して、あとで再送するなど）。
+
+    メッセージには送った順に (1) (2) … と番号を付け、商品には通知全体での通し番号を付ける。
+
+    使い方:
+        with StreamingDiscordNotifier(webhook_url) as notifier:
+            notifier.add(product)
+        # またはブロックの外で notifier.close(note="...") を呼ぶ
+    """
+
+    def __init__(
+        self,
+        webhook_url: str,
+        max_latency_seconds: float = 60.0,
+        on_sent=None,
+        client: DiscordWebhookClient | None = None,
+        compact: bool = False,
+        on_failed=None,
+    ):
+        self.webhook_url = webhook_url
+        self.max_latency_seconds = max_latency_seconds
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.client = client or default_webhook_client
+        self.compact = compact
+        self.items_per_flush = LINKS_PER_MESSAGE if compact else EMBEDS_PER_MESSAGE
+
+        # (追加した時刻, 商品) のリスト
+        self._buffer: list[tuple[float, str | dict]] = []
+        self._condition = threading.Condition()
+        self._closing = False
+        self._closed = False
+        self._worker: threading.Thread | None = None
+
+        # 統計（受け取った商品数・送ったメッセージ数・送信に失敗したメッセージ数）
+        self.items_added = 0
+        self.messages_sent = 0
+        self.messages_failed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, item: str | dict):
+        """通知する商品を1件追加する（送信は待たない）"""
+        with self._condition:
+            if self._closing:
+                raise RuntimeError("StreamingDiscordNotifier は既に終了しています。")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="discord-notifier", daemon=True)
+                self._worker.start()
+            self._buffer.append((time.monotonic(), item))
+            self.items_added += 1
+            self._condition.notify_all()
+
+    def close(self, note: str | None = None, still_available: int = 0):
+        """
+        溜まっている商品をすべて送り、最後に見出しのメッセージを送る。
+        note を渡すと見出しの下に添え、still_available に通知済みのため省いた商品の件数を渡すと1行で添える。
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._closing = True
+            worker = self._worker
+            self._condition.notify_all()
+        if worker is not None:
+            worker.join()
+
+        if not self.items_added and not still_available and not note:
+            return
+
+        if self.items_added:
+            content = f"{HEADER_TITLE} - 合計 {self.items_added}件の商品が見つかりました！✨（{self.messages_sent}件のメッセージ）"
+        else:
+            content = f"{HEADER_TITLE} - 新着の商品はありませんでした"
+        if still_available:
+            content += f"\n{format_still_available(still_available)}"
+        if note:
+            content += f"\n{note}"
+        if post_discord_message(self.webhook_url, {"content": content}, self.client):
+            print(f"✅ すべての通知が完了しました！ (合計 {self.items_added}件)")
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        return f"{self.items_added} 件を {self.messages_sent} メッセージで送信（失敗 {self.messages_failed} メッセージ）"
+
+    def _run(self):
+        """送信スレッドの本体。1メッセージ分揃うか、待ち時間の上限に達するたびに送る"""
+        sent_items = 0
+        while True:
+            with self._condition:
+                while True:
+                    if len(self._buffer) >= self.items_per_flush or (self._closing and self._buffer):
+                        break
+                    if self._closing:
+                        return
+                    if self._buffer:
+                        waited = time.monotonic() - self._buffer[0][0]
+                        if waited >= self.max_latency_seconds:
+                            break
+                        self._condition.wait(self.max_latency_seconds - waited)
+                    else:
+                        self._condition.wait()
+
+                batch = [item for _, item in self._buffer[:self.items_per_flush]]
+                self._buffer = self._buffer[self.items_per_flush:]
+
+            # 文字数の上限で1メッセージに収まらない場合は、複数メッセージに分けて送る
+            all_sent = True
+            for embeds in build_message_embeds(batch, start_number=sent_items + 1, compact=self.compact):
+                message_number = self.messages_sent + self.messages_failed + 1
+                payload = {"content": f"📦 見つかった商品 ({message_number})", "embeds": embeds}
+                if post_discord_message(self.webhook_url, payload, self.client):
+                    self.messages_sent += 1
+                    print(f"✅ Discordへの通知に成功しました！ (メッセージ {message_number})")
+                else:
+                    self.messages_failed += 1
+                    all_sent = False
+            sent_items += len(batch)
 
-    print(f"✅ すべての通知が完了しました！ (合計 {total_items}件)")
+            if all_sent and self.on_sent is not None:
+                self.on_sent(batch)
+            elif not all_sent and self.on_failed is not None:
+                self.on_failed(batch)
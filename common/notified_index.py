@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+
+# 既定の再通知までの期間（秒）
+DEFAULT_RENOTIFY_AFTER_SECONDS = 28 * 24 * 60 * 60
+
+
+class NotifiedIndex:
+    """
+    通知済みの商品とサイズを、実行をまたいで覚えておく索引（SQLite）。
+
+    商品のキー（正規化した商品ID など）とサイズの組ごとに、通知した日時と価格を保存する。
+    次のどれかに当てはまる商品だけを「新着・変更あり」として通知し、それ以外は通知を省く。
+        - まだ通知していないサイズがある
+        - 前回の通知から renotify_after_seconds 以上たったサイズがある
+        - 前回の通知より価格が下がった
+
+    サイズが分からない商品（sizes が空）は、そのサイズのどれかを通知済みなら通知済みとみなす。
+
+    使い方:
+        index = NotifiedIndex(path)
+        if index.is_new_or_changed(key, ["14Y"], price=5990):
+            ...通知する...
+            index.mark_notified(key, ["14Y"], price=5990)
+    """
+
+    # サイズが分からない商品を保存するときのサイズ
+    ANY_SIZE = ""
+
+    def __init__(self, path: str, renotify_after_seconds: int = DEFAULT_RENOTIFY_AFTER_SECONDS):
+        self.path = path
+        self.renotify_after_seconds = renotify_after_seconds
+        self._lock = threading.Lock()
+
+        # 統計（新着・変更ありと判定した件数 / 通知済みとして省いた件数）
+        self.new_or_changed = 0
+        self.already_notified = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notified (
+                product_key TEXT NOT NULL,
+                size TEXT NOT NULL,
+                price INTEGER,
+                notified_at REAL NOT NULL,
+                PRIMARY KEY (product_key, size)
+            )
+            """
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def is_new_or_changed(self, product_key: str, sizes: list[str], price: int | None = None) -> bool:
+        """この商品・サイズを通知すべきか（新着・変更あり・再通知の期間を過ぎた場合は True）"""
+        now = time.time()
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT size, price, notified_at FROM notified WHERE product_key = ?", (product_key,)
+            ).fetchall()
+
+            notified = {
+                size: notified_price
+                for size, notified_price, notified_at in rows
+                if now - notified_at < self.renotify_after_seconds
+            }
+            if sizes:
+                changed = any(size not in notified for size in sizes)
+            else:
+                changed = not notified
+
+            # 前回の通知より値下がりしていれば、同じサイズでも通知する
+            if not changed and price is not None:
+                changed = any(
+                    notified_price is not None and price < notified_price
+                    for size, notified_price in notified.items()
+                    if not sizes or size in sizes
+                )
+
+            if changed:
+                self.new_or_changed += 1
+            else:
+                self.already_notified += 1
+            return changed
+
+    def mark_notified(self, product_key: str, sizes: list[str], price: int | None = None):
+        """この商品・サイズを通知したことを保存する"""
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO notified (product_key, size, price, notified_at) VALUES (?, ?, ?, ?)",
+                [(product_key, size, price, now) for size in (sizes or [self.ANY_SIZE])],
+            )
+            self._connection.commit()
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        return f"新着・変更あり {self.new_or_changed} 件 / 通知済みのため省略 {self.already_notified} 件"
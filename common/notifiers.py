@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+
+from common.discord import DiscordWebhookClient, StreamingDiscordNotifier
+
+
+class JsonlSinkNotifier:
+    """
+    見つかった商品を、1行1件のJSON（JSONL）でファイルに追記する通知先。
+    StreamingDiscordNotifier と同じ使い方（add / close / summary）ができる。
+
+    行の形式:
+        {"type": "match", "at": 時刻, "item": 商品レコード}
+        {"type": "summary", "at": 時刻, "items": 件数, "still_available": 件数, "note": ...}
+    """
+
+    def __init__(self, path: str, on_sent=None, on_failed=None):
+        self.path = path
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self._lock = threading.Lock()
+        self._file = None
+        self._closed = False
+
+        # 統計（書き込んだ件数・書き込みに失敗した件数）
+        self.items_added = 0
+        self.items_failed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, item: str | dict):
+        """商品を1件書き込む"""
+        try:
+            self._write({"type": "match", "at": time.time(), "item": item})
+        except OSError as e:
+            print(f"❌ 通知ファイルへの書き込みに失敗しました: {e}")
+            self.items_failed += 1
+            if self.on_failed is not None:
+                self.on_failed([item])
+            return
+        self.items_added += 1
+        if self.on_sent is not None:
+            self.on_sent([item])
+
+    def close(self, note: str | None = None, still_available: int = 0):
+        """件数をまとめた行を書き込んで、ファイルを閉じる"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self.items_added or still_available or note:
+            try:
+                self._write({
+                    "type": "summary",
+                    "at": time.time(),
+                    "items": self.items_added,
+                    "still_available": still_available,
+                    "note": note,
+                }, closing=True)
+            except OSError as e:
+                print(f"❌ 通知ファイルへの書き込みに失敗しました: {e}")
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        return f"{self.items_added} 件を書き込み（失敗 {self.items_failed} 件）"
+
+    def _write(self, entry: dict, closing: bool = False):
+        with self._lock:
+            if self._closed and not closing:
+                raise RuntimeError("JsonlSinkNotifier は既に終了しています。")
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+
+class FanOutNotifier:
+    """
+    同じ商品を、複数の通知先（DiscordのWebhook・JSONLファイルなど）に送る通知クラス。
+
+    通知先ごとに、待ち行列・送信スレッド・レート制限の状態（DiscordWebhookClient）を別々に持つため、
+    遅い・失敗し続ける通知先があっても、他の通知先への送信は待たされない。
+    close() も全通知先を並行に閉じる。
+
+    通知先は load_destinations() で設定ファイルから読み込む。
+    on_sent / on_failed は、(通知先の名前, 商品のリスト) で呼ばれる。
+
+    使い方:
+        notifier = FanOutNotifier(load_destinations(path, default_webhook_url), on_sent=...)
+        notifier.add(product)                   # すべての通知先に送る
+        notifier.add_to("family", product)      # 1つの通知先にだけ送る（再送など）
+        notifier.close(note="...")
+    """
+
+    def __init__(
+        self,
+        destinations: list[dict],
+        max_latency_seconds: float = 60.0,
+        on_sent=None,
+        on_failed=None,
+        compact: bool = False,
+    ):
+        self.notifiers = {}
+        for destination in destinations:
+            name = destination["name"]
+            if name in self.notifiers:
+                raise ValueError(f"通知先の名前が重複しています: {name}")
+            self.notifiers[name] = self._build(destination, max_latency_seconds, on_sent, on_failed, compact)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def destination_names(self) -> list[str]:
+        return list(self.notifiers)
+
+    def add(self, item: str | dict):
+        """商品をすべての通知先に送る（送信は待たない）"""
+        for name in self.notifiers:
+            self.add_to(name, item)
+
+    def add_to(self, name: str, item: str | dict):
+        """商品を1つの通知先にだけ送る（送信は待たない）"""
+        self.notifiers[name].add(item)
+
+    def close(self, note: str | None = None, still_available: int = 0):
+        """すべての通知先の残りを並行に送り、見出しを送る"""
+        workers = [
+            threading.Thread(
+                target=notifier.close,
+                kwargs={"note": note, "still_available": still_available},
+                name=f"notifier-close-{name}",
+            )
+            for name, notifier in self.notifiers.items()
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー（通知先ごと）"""
+        return " / ".join(f"{name}: {notifier.summary()}" for name, notifier in self.notifiers.items())
+
+    @staticmethod
+    def _build(destination: dict, max_latency_seconds: float, on_sent, on_failed, compact: bool):
+        name = destination["name"]
+
+        def sent(batch, name=name):
+            if on_sent is not None:
+                on_sent(name, batch)
+
+        def failed(batch, name=name):
+            if on_failed is not None:
+                on_failed(name, batch)
+
+        if destination["type"] == "discord":
+            return StreamingDiscordNotifier(
+                destination["webhook_url"],
+                max_latency_seconds=destination.get("max_latency_seconds", max_latency_seconds),
+                on_sent=sent,
+                on_failed=failed,
+                # 通知先ごとにレート制限の状態を持つ（1つのWebhookの待ちが他に波及しないように）
+                client=DiscordWebhookClient(),
+                compact=destination.get("compact", compact),
+            )
+        if destination["type"] == "jsonl":
+            return JsonlSinkNotifier(destination["path"], on_sent=sent, on_failed=failed)
+        raise ValueError(f"未対応の通知先の種類です: {destination['type']}（{name}）")
+
+
+def load_destinations(path: str | None, default_webhook_url: str | None = None) -> list[dict]:
+    """
+    通知先の設定ファイル（JSON）を読み込む。
+
+    設定ファイルは通知先のリストで、Webhook URLなどの秘密の値は環境変数の名前で指定する:
+        [
+            {"name": "family", "type": "discord", "webhook_url_env": "DISCORD_WEBHOOK_URL"},
+            {"name": "archive", "type": "discord", "webhook_url_env": "DISCORD_ARCHIVE_WEBHOOK_URL", "optional": true},
+            {"name": "log", "type": "jsonl", "path": ".state/notifications.jsonl"}
+        ]
+    "optional": true の通知先は、環境変数が設定されていなければ使わない。
+    jsonl の相対パスは、設定ファイルのディレクトリからのパスとみなす。
+
+    設定ファイルがない場合は、default_webhook_url のDiscordだけを通知先にする。
+    """
+    if not path or not os.path.exists(path):
+        return [{"name": "discord", "type": "discord", "webhook_url": default_webhook_url}]
+
+    with open(path, encoding="utf-8") as config_file:
+        config = json.load(config_file)
+
+    destinations = []
+    for entry in config:
+        destination = dict(entry)
+        if destination["type"] == "discord" and "webhook_url" not in destination:
+            webhook_url = os.getenv(destination.get("webhook_url_env", ""))
+            if not webhook_url:
+                if destination.get("optional"):
+                    print(f"情報: 環境変数 {destination.get('webhook_url_env')} がないため、通知先 {destination['name']} は使いません。")
+                    continue
+                raise ValueError(f"通知先 {destination['name']} のWebhook URLの環境変数 {destination.get('webhook_url_env')} が設定されていません。")
+            destination["webhook_url"] = webhook_url
+        if destination["type"] == "jsonl":
+            destination["path"] = os.path.join(os.path.dirname(os.path.abspath(path)), destination["path"])
+        destinations.append(destination)
+    return destinations
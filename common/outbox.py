@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 送信済みの記録を残しておく期間（秒）。これを過ぎた記録は purge() で消す
+DEFAULT_KEEP_SENT_SECONDS = 7 * 24 * 60 * 60
+
+# 未送信の通知を送り直す期間（秒）。これを過ぎても送れていない通知（設定から外した通知先の分など）は purge() で消す
+DEFAULT_KEEP_PENDING_SECONDS = 14 * 24 * 60 * 60
+
+
+class NotificationOutbox:
+    """
+    送信する通知を、送る前にいったん書き込んでおく送信箱（SQLite）。
+
+    通知する商品は、まず enqueue() で「未送信」として保存してから送り、送れたら mark_sent() で「送信済み」にする。
+    送信の途中でプロセスが止まったり、Webhookへの送信に失敗したりしても未送信のまま残るため、
+    次の実行（または --flush）で pending() から取り出して送り直せる（少なくとも1回は届く）。
+
+    各通知は呼び出し側が決める冪等キー（同じ通知なら同じ値）で区別する。
+    通知先が複数ある場合は、通知先ごとに別のキーで書き込み、destination に通知先の名前を入れる。
+    未送信の通知と同じキーを enqueue() しても二重には入らない。
+    送信済みの通知と同じキーを enqueue() した場合は、再通知として未送信に戻す。
+
+    使い方:
+        outbox = NotificationOutbox(path)
+        if outbox.enqueue(key, item, destination="family"):
+            ...送る...
+        outbox.mark_sent([key])
+        for key, item in outbox.pending("family"):   # 送れなかった分の再送
+            ...
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+
+    def __init__(
+        self,
+        path: str,
+        keep_sent_seconds: int = DEFAULT_KEEP_SENT_SECONDS,
+        keep_pending_seconds: int = DEFAULT_KEEP_PENDING_SECONDS,
+    ):
+        self.path = path
+        self.keep_sent_seconds = keep_sent_seconds
+        self.keep_pending_seconds = keep_pending_seconds
+        self._lock = threading.Lock()
+
+        # 統計（書き込んだ件数・送信済みにした件数・送信に失敗した件数・送れないまま期限切れで消した件数）
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.expired = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                destination TEXT NOT NULL,
+                item TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, created_at)")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        """未送信の件数（すべての通知先の合計）"""
+        return sum(self.pending_counts().values())
+
+    def pending_counts(self) -> dict[str, int]:
+        """通知先ごとの未送信の件数"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT destination, COUNT(*) FROM outbox WHERE status = ? GROUP BY destination", (self.PENDING,)
+            ).fetchall()
+        return dict(rows)
+
+    def enqueue(self, key: str, item: dict, destination: str) -> bool:
+        """
+        通知を未送信として書き込む（送る前に呼ぶ）。
+
+        Returns:
+            新しく書き込んだ場合は True。同じキーの通知が既に未送信で残っている場合は False
+            （送信は既に予定されているため、呼び出し側は送らなくてよい）
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status FROM outbox WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[0] == self.PENDING:
+                return False
+            self._connection.execute(
+                """
+                INSERT OR REPLACE INTO outbox
+                    (idempotency_key, destination, item, status, attempts, last_error, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 0, NULL, ?, ?)
+                """,
+                (key, destination, json.dumps(item, ensure_ascii=False), self.PENDING, now, now),
+            )
+            self._connection.commit()
+            self.enqueued += 1
+            return True
+
+    def pending(self, destination: str | None = None, limit: int | None = None) -> list[tuple[str, dict]]:
+        """未送信の通知を、書き込んだ順に (冪等キー, 通知) のリストで返す（destination を渡すとその通知先の分だけ）"""
+        query = "SELECT idempotency_key, item FROM outbox WHERE status = ?"
+        params: tuple = (self.PENDING,)
+        if destination is not None:
+            query += " AND destination = ?"
+            params += (destination,)
+        query += " ORDER BY created_at"
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [(key, json.loads(item)) for key, item in rows]
+
+    def mark_sent(self, keys: list[str]):
+        """送れた通知を送信済みにする"""
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE idempotency_key = ?",
+                [(self.SENT, now, key) for key in keys],
+            )
+            self._connection.commit()
+            self.sent += len(keys)
+
+    def mark_failed(self, keys: list[str], error: str = ""):
+        """送れなかった通知の試行回数とエラーを記録する（未送信のまま残る）"""
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ?, updated_at = ? WHERE idempotency_key = ?",
+                [(error, now, key) for key in keys],
+            )
+            self._connection.commit()
+            self.failed += len(keys)
+
+    def purge(self) -> int:
+        """
+        keep_sent_seconds より前に送信済みになった記録と、keep_pending_seconds より前に書き込んだまま
+        送れていない通知を消す。消した件数を返す
+        """
+        now = time.time()
+        with self._lock:
+            sent = self._connection.execute(
+                "DELETE FROM outbox WHERE status = ? AND updated_at < ?",
+                (self.SENT, now - self.keep_sent_seconds),
+            ).rowcount
+            expired = self._connection.execute(
+                "DELETE FROM outbox WHERE status = ? AND created_at < ?",
+                (self.PENDING, now - self.keep_pending_seconds),
+            ).rowcount
+            self._connection.commit()
+            self.expired += expired
+            return sent + expired
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        summary = f"書き込み {self.enqueued} 件 / 送信済み {self.sent} 件 / 送信失敗 {self.failed} 件"
+        if self.expired:
+            summary += f" / 送れないまま期限切れ {self.expired} 件"
+        return summary
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from playwright.sync_api import sync_playwright
+
+from common.scrapers.request_filter import RequestFilter
+
+
+class BrowserPool:
+    """
+    商品ページを開くための、起動済みブラウザのプール。
+
+    ワーカースレッドごとにChromiumを1つ起動したまま保持し、
+    1ページ取得するたびに、使い回しのコンテキストから新しいタブを開いて閉じる。
+    メモリの肥大化を防ぐため、コンテキストは recycle_after ページごとに作り直す。
+    （Playwrightの同期APIはスレッドをまたいで使えないため、ブラウザは必ず自分のワーカーの中だけで操作する）
+
+    ワーカーは最初に取得を依頼された時点で、size まで順に起動する。
+
+    使い方:
+        with BrowserPool(size=3) as pool:
+            text = pool.fetch_text(url)   # どのスレッドから呼んでもよい
+    """
+
+    def __init__(
+        self,
+        user_agent: str,
+        size: int = 3,
+        recycle_after: int = 20,
+        request_filter: RequestFilter | None = None,
+        headless: bool = True,
+        timeout_ms: int = 30000,
+        result_timeout: float | None = None,
+    ):
+        self.user_agent = user_agent
+        self.size = max(1, size)
+        self.recycle_after = max(1, recycle_after)
+        self.request_filter = request_filter or RequestFilter()
+        self.headless = headless
+        self.timeout_ms = timeout_ms
+        # fetch_text が結果を待つ最大秒数（順番待ちの時間も含むため、ページの読み込みのタイムアウトより長くする）
+        self.result_timeout = result_timeout if result_timeout is not None else max(60.0, timeout_ms / 1000 * 4)
+
+        self._jobs: queue.Queue = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # 統計（ブラウザ起動回数・コンテキスト作成回数・取得ページ数）
+        self.browser_launches = 0
+        self.contexts_created = 0
+        self.pages_fetched = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, url: str) -> Future:
+        """
+        ページのテキスト取得を依頼する。
+
+        Returns:
+            body のテキストを結果に持つ Future
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BrowserPool は既に終了しています。")
+            if len(self._threads) < self.size:
+                worker = threading.Thread(
+                    target=self._worker,
+                    name=f"browser-pool-{len(self._threads) + 1}",
+                    daemon=True,
+                )
+                self._threads.append(worker)
+                worker.start()
+            self._jobs.put((url, future))
+        return future
+
+    def fetch_text(self, url: str) -> str:
+        """
+        ページを開き、body のテキストを返す（取得が終わるまで待つ）。
+        result_timeout 秒たっても終わらなければ concurrent.futures.TimeoutError を送出する。
+        """
+        future = self.submit(url)
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FuturesTimeoutError:
+            # まだ順番待ちなら取り消す（実行中の場合は、ワーカーが終わり次第結果を捨てる）
+            future.cancel()
+            raise
+
+    def close(self):
+        """すべてのワーカーに終了を伝え、ブラウザが閉じるのを待つ"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._jobs.put(None)
+        for worker in threads:
+            worker.join()
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        return (
+            f"{self.pages_fetched} ページ取得 / ブラウザ起動 {self.browser_launches} 回"
+            f" / コンテキスト作成 {self.contexts_created} 回"
+        )
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _worker(self):
+        """ワーカースレッドの本体。自分専用のブラウザを保持し、依頼されたページを順に開く"""
+        playwright = None
+        browser = None
+        context = None
+        context_uses = 0
+
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+
+                url, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    # ブラウザが落ちていたら起動し直す
+                    if browser is None or not browser.is_connected():
+                        if playwright is None:
+                            playwright = sync_playwright().start()
+                        browser = playwright.chromium.launch(headless=self.headless)
+                        context = None
+                        self._count("browser_launches")
+
+                    # コンテキストは一定回数使ったら作り直す
+                    if context is None or context_uses >= self.recycle_after:
+                        if context is not None:
+                            context.close()
+                        context = browser.new_context(user_agent=self.user_agent)
+                        self.request_filter.install(context)
+                        context_uses = 0
+                        self._count("contexts_created")
+
+                    context_uses += 1
+                    page = context.new_page()
+                    try:
+                        page.goto(url, timeout=self.timeout_ms, wait_until="domcontentloaded")
+                        future.set_result(page.locator("body").inner_text())
+                        self._count("pages_fetched")
+                    finally:
+                        page.close()
+
+                except Exception as e:
+                    # 結果を返したあとの後始末（page.close など）で失敗した場合は、結果はそのままにする
+                    if not future.done():
+                        future.set_exception(e)
+                    # 後始末に失敗したコンテキストは使い回さず、次のページで作り直す
+                    if context is not None:
+                        try:
+                            context.close()
+                        except Exception:
+                            pass
+                        context = None
+
+        finally:
+            if browser is not None:
+                try:
+                    browser.close()
+                except Exception:
+                    pass
+            if playwright is not None:
+                playwright.stop()
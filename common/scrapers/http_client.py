@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import nullcontext
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.concurrency import OVERLOAD_STATUS_CODES, AdaptiveLimiter, is_overload_error
+
+# 429 に Retry-After がない・読めない場合に、次のリクエストまで待つ秒数と、Retry-After に従って待つ秒数の上限
+DEFAULT_RETRY_AFTER_SECONDS = 5.0
+MAX_RETRY_AFTER_SECONDS = 60.0
+
+
+class FetchStats:
+    """
+    ページをどの経路で取得したか（HTTP / Playwright / 失敗）を数えるカウンタ。
+    複数スレッドから同時に記録してもよい。
+    """
+
+    LABELS = {
+        "http": "HTTP",
+        "playwright": "Playwright",
+        "not_modified": "変更なし（304）",
+        "failed": "失敗",
+    }
+
+    def __init__(self):
+        self._counts: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, path: str):
+        """取得経路を1件記録する（"http" / "playwright" / "failed" など）"""
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+
+    def snapshot(self) -> dict[str, int]:
+        """現在のカウントのコピーを返す"""
+        with self._lock:
+            return dict(self._counts)
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        counts = self.snapshot()
+        if not counts:
+            return "取得なし"
+        return " / ".join(f"{self.LABELS.get(path, path)}: {count}件" for path, count in counts.items())
+
+
+class HttpClient:
+    """
+    コネクションプール付きのHTTPクライアント（requests.Session のラッパー）。
+
+    同じホストへの接続を使い回すため、1回の実行中は1つのインスタンスを共有する。
+    一時的なサーバーエラーは urllib3 の Retry で数回だけ再試行する。
+    limiter を渡すと、同時に送るリクエスト数を応答の様子に合わせて自動で調整する。
+
+    429（リクエストが多すぎる）は urllib3 の中で黙って待って再試行せず、混雑の合図として limiter に報告し、
+    Retry-After の秒数（上限 MAX_RETRY_AFTER_SECONDS）が過ぎるまで、このクライアントの次のリクエストを待たせる。
+    """
+
+    def __init__(
+        self,
+        user_agent: str,
+        pool_size: int = 10,
+        timeout: float = 15.0,
+        limiter: AdaptiveLimiter | None = None,
+    ):
+        self.timeout = timeout
+        self.limiter = limiter
+        self._rate_limit_lock = threading.Lock()
+        self._paused_until = 0.0
+
+        # 統計（429 を受けた回数）
+        self.rate_limited = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept-Language": "ja,en-US;q=0.8,en;q=0.6",
+        })
+
+        retry = Retry(
+            total=2,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=("GET",),
+            # 429 は再試行せずに返させ、limiter に報告する
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """プール中の接続をすべて閉じる"""
+        self.session.close()
+
+    def wait_if_rate_limited(self):
+        """429 の Retry-After で指定された時刻まで待つ（指定がなければすぐに戻る）"""
+        with self._rate_limit_lock:
+            wait_seconds = self._paused_until - time.monotonic()
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+    def _pause_for_rate_limit(self, response: requests.Response):
+        """429 のレスポンスの Retry-After に従って、次のリクエストを待たせる"""
+        try:
+            wait_seconds = float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            wait_seconds = DEFAULT_RETRY_AFTER_SECONDS
+        wait_seconds = min(max(wait_seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+        with self._rate_limit_lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + wait_seconds)
+        print(f"  [HTTP] 429 リクエストが多すぎるため、{wait_seconds:g}秒待ってから次のリクエストを送ります: {response.url}")
+
+    def get_text(self, url: str) -> str | None:
+        """
+        URLをGETし、レスポンス本文を返す。
+
+        Returns:
+            本文の文字列。通信エラーや 200 以外のステータスの場合は None
+        """
+        result = self.get_text_if_modified(url)
+        if result is None or result["not_modified"]:
+            return None
+        return result["text"]
+
+    def get_text_if_modified(
+        self,
+        url: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> dict | None:
+        """
+        前回取得したときの ETag / Last-Modified を付けて条件付きでGETする。
+
+        Returns:
+            {"not_modified": 変更がなかったか（304）, "text": 本文（304 の場合は None）,
+             "etag": 今回の ETag, "last_modified": 今回の Last-Modified}。
+            通信エラーや 200 / 304 以外のステータスの場合は None
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        self.wait_if_rate_limited()
+        with self.limiter.slot() if self.limiter else nullcontext() as slot:
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"  [HTTP] 取得失敗: {url} - {e}")
+                if slot is not None and is_overload_error(e):
+                    slot.mark_overloaded()
+                return None
+
+            if slot is not None and response.status_code in OVERLOAD_STATUS_CODES:
+                slot.mark_overloaded()
+        if response.status_code == 429:
+            self._pause_for_rate_limit(response)
+
+        result = {
+            "not_modified": response.status_code == 304,
+            "text": None,
+            # 304 のレスポンスに検証用ヘッダーがなければ、前回の値をそのまま使う
+            "etag": response.headers.get("ETag") or etag,
+            "last_modified": response.headers.get("Last-Modified") or last_modified,
+        }
+        if result["not_modified"]:
+            return result
+
+        if response.status_code != 200:
+            print(f"  [HTTP] ステータス {response.status_code}: {url}")
+            return None
+
+        # Content-Typeに文字コードがない場合でも文字化けしないよう推定値を使う
+        if not response.encoding or response.encoding.lower() == "iso-8859-1":
+            response.encoding = response.apparent_encoding
+        result["text"] = response.text
+        return result
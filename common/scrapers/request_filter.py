@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import threading
+from urllib.parse import urlparse
+
+# スクレイピングでは不要なリソースの種類（Playwrightの request.resource_type）
+DEFAULT_BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+
+# 広告・計測タグのホスト（ホスト名がこれらで終わるリクエストを遮断する）
+DEFAULT_BLOCKED_HOST_PATTERNS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "facebook.net",
+    "criteo.com",
+    "criteo.net",
+    "amazon-adsystem.com",
+    "yjtag.jp",
+    "yads.yahoo.co.jp",
+    "b92.yahoo.co.jp",
+    "clarity.ms",
+    "hotjar.com",
+    "rtoaster.jp",
+    "microad.jp",
+)
+
+# 遮断したリクエストの推定サイズ（バイト）。遮断したレスポンスは受信しないため実測できない
+ESTIMATED_BYTES_BY_RESOURCE_TYPE = {
+    "image": 60_000,
+    "media": 500_000,
+    "font": 40_000,
+    "script": 30_000,
+    "stylesheet": 15_000,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+
+class RequestFilter:
+    """
+    ブラウザのコンテキストに page.route を仕掛け、不要なリクエストを中断するポリシー。
+
+    リソースの種類（画像・フォント・動画など）と、広告・計測タグのホスト名で判定する。
+    エージェントごとに遮断対象を変えられるよう、コンストラクタで上書きできる。
+    遮断した件数と推定バイト数を記録し、summary() で確認できる。
+
+    使い方:
+        request_filter = RequestFilter()
+        request_filter.install(context)            # sync_api のコンテキスト
+        await request_filter.install_async(context)  # async_api のコンテキスト
+    """
+
+    def __init__(
+        self,
+        blocked_resource_types: tuple[str, ...] = DEFAULT_BLOCKED_RESOURCE_TYPES,
+        blocked_host_patterns: tuple[str, ...] = DEFAULT_BLOCKED_HOST_PATTERNS,
+    ):
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_host_patterns = tuple(pattern.lower().lstrip(".") for pattern in blocked_host_patterns)
+        self._lock = threading.Lock()
+        self.allowed_requests = 0
+        self.blocked_requests = 0
+        self.blocked_bytes = 0
+        self.blocked_by_reason: dict[str, int] = {}
+
+    def match(self, resource_type: str, url: str) -> str | None:
+        """
+        リクエストを遮断すべきか判定する。
+
+        Returns:
+            遮断理由（"type:image" / "host:doubleclick.net" など）。通す場合は None
+        """
+        if resource_type in self.blocked_resource_types:
+            return f"type:{resource_type}"
+
+        host = (urlparse(url).hostname or "").lower()
+        for pattern in self.blocked_host_patterns:
+            if host == pattern or host.endswith("." + pattern):
+                return f"host:{pattern}"
+        return None
+
+    def _record(self, resource_type: str, reason: str | None):
+        with self._lock:
+            if reason is None:
+                self.allowed_requests += 1
+                return
+            self.blocked_requests += 1
+            self.blocked_bytes += ESTIMATED_BYTES_BY_RESOURCE_TYPE.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+            self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + 1
+
+    def _handle_route(self, route):
+        request = route.request
+        reason = self.match(request.resource_type, request.url)
+        self._record(request.resource_type, reason)
+        if reason:
+            route.abort()
+        else:
+            route.continue_()
+
+    async def _handle_route_async(self, route):
+        request = route.request
+        reason = self.match(request.resource_type, request.url)
+        self._record(request.resource_type, reason)
+        if reason:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def install(self, context):
+        """sync_api の BrowserContext（または Page）にフィルタを仕掛ける"""
+        context.route("**/*", self._handle_route)
+
+    async def install_async(self, context):
+        """async_api の BrowserContext（または Page）にフィルタを仕掛ける"""
+        await context.route("**/*", self._handle_route_async)
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        with self._lock:
+            total = self.allowed_requests + self.blocked_requests
+            top_reasons = sorted(self.blocked_by_reason.items(), key=lambda item: item[1], reverse=True)[:5]
+            reasons = ", ".join(f"{reason}={count}" for reason, count in top_reasons)
+            return (
+                f"遮断 {self.blocked_requests}/{total} リクエスト"
+                f"（推定 {self.blocked_bytes / 1_000_000:.1f} MB）"
+                + (f" [{reasons}]" if reasons else "")
+            )
@@ -1,119 +1,1094 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import queue
+import re
+import threading
 import time
+from html import unescape
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.scrapers.http_client import FetchStats, HttpClient
+from common.scrapers.request_filter import RequestFilter
+
+# ブラウザのUser-Agent
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# 検索結果の商品画像リンクに付くクラス名（の接頭辞）
+TARGET_LINK_CLASS = "ItemImageLink_SearchResultItemImageLink__link__"
+
+# 待機目標のセレクタ（検索結果の商品画像リンク）
+TARGET_SELECTOR = f'a[class*="{TARGET_LINK_CLASS}"]'
+
+# 1ページあたりのアイテム数（検索URLの b= パラメータの刻み幅）
+ITEMS_PER_PAGE = 30
+
+# 同時に取得する検索結果ページ数の既定値
+DEFAULT_PAGE_WINDOW = 4
+
+# 検索結果ページ1ページの取得を試みる回数と、試し直すまでの待ち時間（秒、回数に比例して延ばす）の既定値
+DEFAULT_PAGE_ATTEMPTS = 3
+DEFAULT_PAGE_RETRY_DELAY = 2.0
+
+
+# 検索結果が0件のときにページに表示される文言
+NO_RESULTS_MARKERS = (
+    "条件に一致する商品は見つかりませんでした",
+    "該当する商品が見つかりませんでした",
+    "該当する商品はありません",
+    "一致する商品はありませんでした",
+)
+
+# 検索結果の総件数を読み取るためのパターン
+# （誤った件数はページ送りを黙って打ち切るため、検索結果の件数と分かるキーだけを使う）
+# 埋め込みJSONはHTML全体から、件数の表示は表示テキストから探す
+TOTAL_HITS_PATTERNS = (
+    re.compile(r'"totalResultsAvailable"\s*:\s*"?(\d+)'),
+    re.compile(r'"totalHits"\s*:\s*"?(\d+)'),
+)
+TOTAL_HITS_TEXT_PATTERN = re.compile(r'([\d,]+)\s*件(?:中|の商品|が見つかりました|の検索結果)')
+
+
+def build_search_page_url(base_url: str, page_num: int) -> str:
+    """検索URLにページ番号に対応する b= パラメータを付けて返す（page_numは1始まり）"""
+    start_index = (page_num - 1) * ITEMS_PER_PAGE + 1
+    return f"{base_url}&b={start_index}"
+
+
+def has_no_results_marker(text: str) -> bool:
+    """検索結果ページの表示テキストに「0件」の表示が含まれているかどうか"""
+    return any(marker in text for marker in NO_RESULTS_MARKERS)
+
+
+def parse_total_hits(html: str) -> int | None:
+    """
+    検索結果ページのHTMLから検索結果の総件数を読み取る。
+
+    明示的な件数（埋め込みJSON → 表示テキストの順）を先に探し、見つからない場合だけ
+    表示テキストの「0件」の文言を見る（scriptの中の文言は、表示されていなくても含まれることがあるため）。
+
+    Returns:
+        総件数。読み取れなかった場合は None
+    """
+    for pattern in TOTAL_HITS_PATTERNS:
+        match = pattern.search(html)
+        if match:
+            return int(match.group(1))
+
+    text = html_to_text(html)
+    match = TOTAL_HITS_TEXT_PATTERN.search(text)
+    if match:
+        return int(match.group(1).replace(",", ""))
+    if has_no_results_marker(text):
+        return 0
+    return None
+
+
+def count_search_pages(total_hits: int) -> int:
+    """総件数から検索結果のページ数を計算する"""
+    return math.ceil(total_hits / ITEMS_PER_PAGE)
+
+
 # ---------------------------------------------------------------------------
-# ▼▼▼ ステップ1：1ページ分のリンクを収集する「関数（部品）」▼▼▼
+# ▼▼▼ 商品URLの正規化と重複排除 ▼▼▼
 # ---------------------------------------------------------------------------
-def fetch_yahoo_links_playwright(target_url: str) -> set[str]:
+# 相対URLを解決するときの基準URL
+YAHOO_SHOPPING_ORIGIN = "https://shopping.yahoo.co.jp"
+
+# ホスト名ごとの「ストアID / 商品コード」の取り出し方
+PRODUCT_PATH_PATTERNS = {
+    "store.shopping.yahoo.co.jp": re.compile(r"^/([^/]+)/([^/]+?)\.html$"),
+    "paypaymall.yahoo.co.jp": re.compile(r"^/store/([^/]+)/item/([^/]+?)/?$"),
+}
+
+# 商品の特定に関係しない計測用のクエリパラメータ
+TRACKING_QUERY_PREFIXES = ("sc_", "utm_", "vc_", "ref", "_ga", "fbclid", "gclid", "yclid", "ysclid", "af_")
+
+
+def _match_product_parts(href: str) -> tuple[str, str] | None:
+    """商品リンクから (ストアID, 商品コード) を元の大文字・小文字のまま取り出す"""
+    parsed = urlparse(urljoin(YAHOO_SHOPPING_ORIGIN, href.strip()))
+
+    pattern = PRODUCT_PATH_PATTERNS.get((parsed.hostname or "").lower())
+    if pattern:
+        match = pattern.match(parsed.path)
+        if match:
+            return match.group(1), match.group(2)
+
+    # リダイレクト用URLのクエリに商品URLが埋め込まれている場合
+    for _, value in parse_qsl(parsed.query):
+        if value.startswith("http") and value != href:
+            parts = _match_product_parts(value)
+            if parts:
+                return parts
+    return None
+
+
+def canonicalize_product_url(href: str) -> tuple[str, str] | None:
     """
-    Playwright単独でYahoo!ショッピングにアクセスし,
-    「正解のセレクタ」で商品リンクを直接収集する（1ページ分）。
-    
-    Args:
-        target_url: Yahoo!ショッピングの検索結果ページのURL
+    商品リンクから、商品を一意に特定するキー (ストアID, 商品コード) を取り出す。
+    計測用のクエリパラメータやストアのドメイン違い（PayPayモール等）、大文字・小文字の違いは無視する。
+    リダイレクト用URLのクエリに商品URLが埋め込まれている場合はそれを使う。
 
     Returns:
-        重複を除去した、商品詳細ページのURLのセット
+        (ストアID, 商品コード)。Yahoo!ショッピングの商品URLでない場合は None
+    """
+    parts = _match_product_parts(href)
+    if parts is None:
+        return None
+    return parts[0].lower(), parts[1].lower()
+
+
+def build_product_url(key: tuple[str, str]) -> str:
+    """(ストアID, 商品コード) から、計測パラメータのない商品詳細ページのURLを作る"""
+    store_id, item_code = key
+    return f"https://store.shopping.yahoo.co.jp/{store_id}/{item_code}.html"
+
+
+def strip_tracking_params(href: str) -> str:
+    """URLから計測用のクエリパラメータを取り除く（正規化できないURL用）"""
+    parsed = urlparse(urljoin(YAHOO_SHOPPING_ORIGIN, href.strip()))
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not name.lower().startswith(TRACKING_QUERY_PREFIXES)
+    ]
+    return parsed._replace(query=urlencode(query), fragment="").geturl()
+
+
+class ProductIndex:
+    """
+    商品リンクを (ストアID, 商品コード) のキーで重複排除する索引。
+
+    同じ商品を指す複数のURL（計測パラメータ違い・ドメイン違い）は1件にまとめ、
+    キーごとに計測パラメータを除いた正規のURLを1つだけ保持する。
+    まとめた件数は duplicates で確認できる。
+    """
+
+    def __init__(self):
+        self.urls: dict[tuple[str, str], str] = {}
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, href: str) -> bool:
+        return self.key_for(href) in self.urls
+
+    @staticmethod
+    def key_for(href: str) -> tuple[str, str]:
+        """URLの重複判定用のキー（正規化できないURLは ("", 計測パラメータを除いたURL)）"""
+        return canonicalize_product_url(href) or ("", strip_tracking_params(href))
+
+    def add(self, href: str) -> str | None:
+        """
+        商品リンクを登録する。
+
+        Returns:
+            初めて見る商品なら正規化したURL。既に登録済みの商品なら None
+        """
+        key = self.key_for(href)
+        if key in self.urls:
+            self.duplicates += 1
+            return None
+
+        parts = _match_product_parts(href)
+        self.urls[key] = build_product_url(parts) if parts else key[1]
+        return self.urls[key]
+
+    def summary(self) -> str:
+        """ログ出力用の1行サマリー"""
+        return f"ユニーク商品 {len(self.urls)} 件（重複 {self.duplicates} 件をまとめました）"
+
+
+# ---------------------------------------------------------------------------
+# ▼▼▼ HTML / 埋め込みJSONの解析（ブラウザを使わない高速経路用）▼▼▼
+# ---------------------------------------------------------------------------
+SCRIPT_BLOCK_PATTERN = re.compile(r"<script\b.*?</script>", re.IGNORECASE | re.DOTALL)
+ANCHOR_TAG_PATTERN = re.compile(r"<a\b[^>]*>", re.IGNORECASE)
+IMAGE_TAG_PATTERN = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+NEXT_DATA_PATTERN = re.compile(
+    r'<script[^>]*id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+PRICE_PATTERN = re.compile(r"([\d,]+)\s*円|[¥￥]\s*([\d,]+)")
+ATTRIBUTE_PATTERN = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+JSON_LD_PATTERN = re.compile(
+    r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+# 商品ページとみなすための本文の最低文字数（これより短い場合はJSで描画されるページと判断）
+ITEM_PAGE_MIN_TEXT_LENGTH = 200
+
+
+def _tag_attributes(tag: str) -> dict[str, str]:
+    """開始タグの文字列から属性を辞書で取り出す"""
+    attributes = {}
+    for name, double_quoted, single_quoted in ATTRIBUTE_PATTERN.findall(tag):
+        attributes[name.lower()] = unescape(double_quoted or single_quoted)
+    return attributes
+
+
+def parse_price(text: str) -> int | None:
+    """「3,990円」「¥3,990」のような表記から価格（円）を取り出す"""
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        return None
+    return int((match.group(1) or match.group(2)).replace(",", ""))
+
+
+def _parse_result_card(card_html: str, href: str) -> dict:
+    """
+    検索結果の1商品分のHTML（商品画像リンクから次の商品画像リンクの手前まで）から、
+    タイトル・価格・サムネイルを取り出す。
+    """
+    title = ""
+    thumbnail = ""
+    image_match = IMAGE_TAG_PATTERN.search(card_html)
+    if image_match:
+        image_attributes = _tag_attributes(image_match.group(0))
+        title = image_attributes.get("alt", "").strip()
+        thumbnail = image_attributes.get("src") or image_attributes.get("data-src") or ""
+
+    card_text = html_to_text(card_html)
+    if not title:
+        # 画像に alt がない場合は、価格以外で最初のある程度長い行を商品名とみなす
+        title = next((line for line in card_text.splitlines() if len(line) >= 10 and "円" not in line), "")
+
+    key = canonicalize_product_url(href)
+    return {
+        "url": href,
+        "title": title,
+        "price": parse_price(card_text),
+        "store": key[0] if key else "",
+        "thumbnail": thumbnail,
+    }
+
+
+def _walk_json(node):
+    """JSONの中のすべての辞書を順に返す"""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk_json(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk_json(value)
+
+
+def _embedded_json_products(html: str) -> dict[tuple[str, str], dict]:
+    """
+    埋め込みJSON（__NEXT_DATA__）から、商品URLを持つ要素の商品名・価格・画像を取り出す。
+    HTMLのカードから読み取れなかった項目の補完に使う。
+    """
+    match = NEXT_DATA_PATTERN.search(html)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return {}
+
+    products = {}
+    for node in _walk_json(data):
+        url = node.get("url")
+        if not isinstance(url, str):
+            continue
+        key = canonicalize_product_url(url)
+        if key is None or key in products:
+            continue
+
+        price = node.get("price")
+        if isinstance(price, dict):
+            price = price.get("price") or price.get("value")
+        image = node.get("image") or node.get("imageUrl") or ""
+        if isinstance(image, dict):
+            image = image.get("url") or image.get("medium") or ""
+
+        products[key] = {
+            "title": node.get("name") or node.get("title") or "",
+            "price": int(price) if isinstance(price, (int, float)) or str(price).isdigit() else None,
+            "thumbnail": image if isinstance(image, str) else "",
+        }
+    return products
+
+
+def parse_search_html(html: str) -> tuple[list[dict], int | None] | None:
+    """
+    検索結果ページのHTMLから、商品レコードと検索結果の総件数を取り出す。
+
+    商品レコードは {"url", "title", "price", "store", "thumbnail"} の辞書。
+    HTMLの商品カードから読み取り、足りない項目は埋め込みJSONで補う。
+
+    Returns:
+        (商品レコードのリスト, 総件数 または None)。
+        「0件」のページなら (空のリスト, 0)。
+        商品リンクが1件も見つからない（解析できない）場合は None
+    """
+    total_hits = parse_total_hits(html)
+    if total_hits == 0:
+        return [], 0
+
+    body = SCRIPT_BLOCK_PATTERN.sub("", html)
+
+    # 商品画像リンクの位置で区切り、次の商品画像リンクまでを1商品分のカードとみなす
+    anchors = []
+    for match in ANCHOR_TAG_PATTERN.finditer(body):
+        attributes = _tag_attributes(match.group(0))
+        if TARGET_LINK_CLASS in attributes.get("class", "") and attributes.get("href"):
+            anchors.append((match.start(), attributes["href"]))
+
+    if not anchors:
+        return None
+
+    json_products = _embedded_json_products(html)
+    records = []
+    seen_hrefs = set()
+    for position, (start, href) in enumerate(anchors):
+        if href in seen_hrefs:
+            continue
+        seen_hrefs.add(href)
+
+        end = anchors[position + 1][0] if position + 1 < len(anchors) else len(body)
+        record = _parse_result_card(body[start:end], href)
+
+        extra = json_products.get(canonicalize_product_url(href))
+        if extra:
+            for field, value in extra.items():
+                if not record[field] and value:
+                    record[field] = value
+        records.append(record)
+
+    return records, total_hits
+
+
+class _VisibleTextParser(HTMLParser):
+    """HTMLから、画面に表示されるテキストだけを取り出すパーサ（body.inner_text の代わり）"""
+
+    SKIP_TAGS = {"head", "script", "style", "noscript", "template", "svg", "iframe"}
+    BLOCK_TAGS = {
+        "br", "p", "div", "section", "article", "li", "ul", "ol", "dl", "dt", "dd",
+        "table", "tr", "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "option", "label",
+    }
+
+    def __init__(self):
+        super().__init__()
+        self._skip_depth = 0
+        self._chunks: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._chunks.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._chunks.append(data)
+
+    def text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self._chunks).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def html_to_text(html: str) -> str:
+    """HTMLから表示テキストを取り出す（script / style などは除く）"""
+    parser = _VisibleTextParser()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+def _json_ld_product_lines(html: str) -> list[str]:
+    """
+    埋め込みJSON（application/ld+json）から商品名・価格・在庫状況を取り出し、
+    AIが読みやすい行のリストにする。
+    """
+    lines = []
+    for raw_json in JSON_LD_PATTERN.findall(html):
+        try:
+            data = json.loads(raw_json.strip())
+        except json.JSONDecodeError:
+            continue
+
+        for node in data if isinstance(data, list) else [data]:
+            if not isinstance(node, dict) or node.get("@type") != "Product":
+                continue
+            if node.get("name"):
+                lines.append(f"商品名: {node['name']}")
+            offers = node.get("offers") or []
+            for offer in offers if isinstance(offers, list) else [offers]:
+                if not isinstance(offer, dict):
+                    continue
+                availability = str(offer.get("availability", "")).rsplit("/", 1)[-1]
+                label = offer.get("name") or offer.get("sku") or ""
+                price = offer.get("price", "")
+                lines.append(f"販売情報: {label} 価格={price} 在庫={availability}".strip())
+    return lines
+
+
+def parse_item_html(html: str) -> str | None:
+    """
+    商品詳細ページのHTMLから、AIに渡すテキストを作る。
+    埋め込みJSONの商品情報を先頭に、続けて表示テキストを並べる。
+
+    Returns:
+        ページのテキスト。JSで描画されるページなどで十分な本文が取れない場合は None
+    """
+    structured_lines = _json_ld_product_lines(html)
+    text = html_to_text(html)
+
+    if len(text) < ITEM_PAGE_MIN_TEXT_LENGTH and not structured_lines:
+        return None
+
+    if structured_lines:
+        return "--- 構造化データ ---\n" + "\n".join(structured_lines) + "\n--- ページ本文 ---\n" + text
+    return text
+
+
+class YahooHttpFetcher:
+    """
+    ブラウザを起動せず、プール済みのHTTP接続で検索ページ・商品ページを取得する高速経路。
+    解析に失敗した場合は None を返すので、呼び出し側でPlaywrightにフォールバックする。
+    """
+
+    def __init__(self, client: HttpClient | None = None):
+        self.client = client or HttpClient(user_agent=USER_AGENT)
+
+    def close(self):
+        self.client.close()
+
+    def fetch_search_page(self, target_url: str) -> tuple[list[dict], int | None] | None:
+        """検索結果ページをHTTPで取得し、商品レコードと総件数を返す（失敗時は None）"""
+        html = self.client.get_text(target_url)
+        if html is None:
+            return None
+        return parse_search_html(html)
+
+    def fetch_item_text(self, target_url: str) -> str | None:
+        """商品詳細ページをHTTPで取得し、AIに渡すテキストを返す（失敗時は None）"""
+        html = self.client.get_text(target_url)
+        if html is None:
+            return None
+        return parse_item_html(html)
+
+    def fetch_item_text_if_modified(
+        self,
+        target_url: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> dict | None:
+        """
+        商品詳細ページを条件付きGETで取得する。
+
+        Returns:
+            {"not_modified", "text", "etag", "last_modified"}（"text" は解析後のテキスト。
+            変更がなかった場合・解析できなかった場合は None）。通信エラーなどの場合は None
+        """
+        result = self.client.get_text_if_modified(target_url, etag, last_modified)
+        if result is None or result["not_modified"]:
+            return result
+        return {**result, "text": parse_item_html(result["text"])}
+
+
+# ---------------------------------------------------------------------------
+# ▼▼▼ ステップ1：ブラウザを使い回す「セッション（部品）」▼▼▼
+# ---------------------------------------------------------------------------
+class YahooSearchScraper:
+    """
+    Chromiumを1回だけ起動し、同じコンテキストで複数の検索結果ページを巡回するセッション。
+
+    ページごとにブラウザを起動し直すコストを避けるため、
+    with ブロックの間はブラウザ・コンテキスト・タブを開いたままにする。
+
+    使い方:
+        with YahooSearchScraper() as scraper:
+            links = scraper.fetch_links(url)
     """
-    
-    product_links = set()
-    
-    # 待機目標のセレクタ
-    TARGET_SELECTOR = 'a[class*="ItemImageLink_SearchResultItemImageLink__link__"]'
 
-    with sync_playwright() as p:
+    def __init__(self, headless: bool = True, request_filter: RequestFilter | None = None):
+        self.headless = headless
+        # 画像・フォント・広告タグなどを読み込まないためのフィルタ
+        self.request_filter = request_filter or RequestFilter()
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._page = None
+
+    def __enter__(self):
+        self._playwright = sync_playwright().start()
         # headless=True にすると裏側で動きます
-        browser = p.chromium.launch(headless=True) 
-        
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = context.new_page()
+        self._browser = self._playwright.chromium.launch(headless=self.headless)
+        self._context = self._browser.new_context(user_agent=USER_AGENT)
+        self.request_filter.install(self._context)
+        self._page = self._context.new_page()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ブラウザとPlaywrightドライバを終了する"""
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+        self._context = None
+        self._page = None
+
+    def fetch_links(self, target_url: str) -> set[str]:
+        """
+        起動済みのブラウザで検索結果ページを開き、
+        「正解のセレクタ」で商品リンクを直接収集する（1ページ分）。
+
+        Args:
+            target_url: Yahoo!ショッピングの検索結果ページのURL
+
+        Returns:
+            重複を除去した、商品詳細ページのURLのセット
+        """
+        if self._page is None:
+            raise RuntimeError("YahooSearchScraper は with ブロックの中で使用してください。")
+
+        product_links = set()
+        page = self._page
 
         try:
             print(f"ブラウザで {target_url} にアクセスしています...")
-            
+
             page.goto(
-                target_url, 
-                timeout=60000, 
+                target_url,
+                timeout=60000,
                 wait_until="domcontentloaded"
             )
-            
+
+            # 「0件」の表示があれば、セレクタのタイムアウトを待たずに終了する
+            if parse_total_hits(page.content()) == 0:
+                print("情報: 検索結果が0件のページです。")
+                return set()
+
             print(f"商品リンク（{TARGET_SELECTOR}）の読み込みを待機します...")
-            
+
             page.wait_for_selector(TARGET_SELECTOR, timeout=30000)
-            
+
             print("商品リンクの読み込みを確認しました。")
-            
+
             link_elements = page.locator(TARGET_SELECTOR).all()
 
             if not link_elements:
                 print("エラー: 待機後も商品リンクの要素が見つかりませんでした。")
-                browser.close()
                 return set()
 
             for link_element in link_elements:
                 href = link_element.get_attribute("href")
                 if href:
                     product_links.add(href)
-                    
+
         except Exception as e:
             # 30秒待っても TARGET_SELECTOR が見つからなかった場合（＝最終ページ）
             # ここでエラーをキャッチし、空のセットを返す
             print(f"情報: 30秒待機しましたが、{TARGET_SELECTOR} が見つかりませんでした。")
             print(f"詳細: {e}")
-            
+
+        return product_links
+
+
+def fetch_yahoo_links_playwright(target_url: str) -> set[str]:
+    """
+    1ページ分だけ収集する場合の薄いラッパー。
+    複数ページを巡回する場合は YahooSearchScraper を直接使うこと。
+
+    Args:
+        target_url: Yahoo!ショッピングの検索結果ページのURL
+
+    Returns:
+        重複を除去した、商品詳細ページのURLのセット
+    """
+    with YahooSearchScraper() as scraper:
+        return scraper.fetch_links(target_url)
+
+# ---------------------------------------------------------------------------
+# ▼▼▼ 複数ページを並行に取得する「ページネータ（非同期版）」▼▼▼
+# ---------------------------------------------------------------------------
+class YahooSearchPaginator:
+    """
+    1つのブラウザ・コンテキスト内で複数タブを開き、
+    検索結果ページを最大 window ページずつ並行に取得する非同期セッション。
+
+    最初に空のページが見つかった時点で、それより後ろのページの取得はキャンセルする。
+    取得に失敗したページ（と、総件数から商品があるはずと分かっているのに空だったページ）は
+    page_attempts 回まで取得し直し、それでも取れなければ RuntimeError で巡回を止める（終端とはみなさない）。
+    http_fetcher を渡すと各ページをまずHTTPで取得し、解析できなかったページだけブラウザで開く
+    （ブラウザはフォールバックが必要になった時点で初めて起動する）。
+
+    使い方:
+        async with YahooSearchPaginator(window=4) as paginator:
+            links = await paginator.collect(base_url)
+    """
+
+    def __init__(
+        self,
+        window: int = DEFAULT_PAGE_WINDOW,
+        headless: bool = True,
+        http_fetcher: YahooHttpFetcher | None = None,
+        stats: FetchStats | None = None,
+        request_filter: RequestFilter | None = None,
+        page_attempts: int = DEFAULT_PAGE_ATTEMPTS,
+        retry_delay: float = DEFAULT_PAGE_RETRY_DELAY,
+    ):
+        self.window = max(1, window)
+        self.headless = headless
+        self.page_attempts = max(1, page_attempts)
+        self.retry_delay = retry_delay
+        self.http_fetcher = http_fetcher
+        self.stats = stats or FetchStats()
+        # 画像・フォント・広告タグなどを読み込まないためのフィルタ
+        self.request_filter = request_filter or RequestFilter()
+        # 同じ商品を指すURLをまとめるための索引
+        self.product_index = ProductIndex()
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._entered = False
+        self._launch_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        self._entered = True
+        # HTTPの高速経路がない場合は最初からブラウザを起動しておく
+        if self.http_fetcher is None:
+            await self._ensure_context()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _ensure_context(self):
+        """ブラウザが未起動なら起動する（高速経路が失敗したときだけ起動するための遅延起動）"""
+        async with self._launch_lock:
+            if self._context is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+                self._context = await self._browser.new_context(user_agent=USER_AGENT)
+                await self.request_filter.install_async(self._context)
+        return self._context
+
+    async def close(self):
+        """ブラウザとPlaywrightドライバを終了する"""
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self._context = None
+        self._entered = False
+
+    async def fetch_page(self, target_url: str) -> tuple[list[dict], int | None] | None:
+        """
+        検索結果ページ1ページ分の商品レコードと検索結果の総件数を取得する。
+
+        HTTPの高速経路があればまずそれを試し、解析できなかった場合だけブラウザで開く。
+
+        Args:
+            target_url: Yahoo!ショッピングの検索結果ページのURL
+
+        Returns:
+            (商品レコードのリスト, 検索結果の総件数 または None)。
+            商品一覧のないページ（最終ページの先）では商品レコードのリストが空になる。
+            ページを開けなかった・解析できなかった場合は None
+        """
+        if not self._entered:
+            raise RuntimeError("YahooSearchPaginator は async with ブロックの中で使用してください。")
+
+        if self.http_fetcher is not None:
+            result = await asyncio.to_thread(self.http_fetcher.fetch_search_page, target_url)
+            if result is not None:
+                self.stats.record("http")
+                return result
+            print(f"情報: HTTPでの解析に失敗したため、ブラウザで取得します: {target_url}")
+
+        result = await self._fetch_page_with_browser(target_url)
+        self.stats.record("playwright" if result is not None else "failed")
+        return result
+
+    async def _fetch_page_with_browser(self, target_url: str) -> tuple[list[dict], int | None] | None:
+        """
+        新しいタブで検索結果ページを開き、描画後のHTMLから商品レコードと総件数を取得する（1ページ分）。
+
+        ページに「0件」の表示があれば、セレクタの待機をせずにすぐ空の結果を返す。
+        商品一覧が描画されなければ空の結果を、ページを開けなかった・解析できなかった場合は None を返す。
+        """
+        context = await self._ensure_context()
+        page = await context.new_page()
+
+        try:
+            await page.goto(target_url, timeout=60000, wait_until="domcontentloaded")
+
+            total_hits = parse_total_hits(await page.content())
+            if total_hits == 0:
+                print(f"情報: {target_url} は検索結果が0件のページです。")
+                return [], 0
+
+            try:
+                await page.wait_for_selector(TARGET_SELECTOR, timeout=30000)
+            except PlaywrightTimeoutError as e:
+                # TARGET_SELECTOR が見つからなかった場合（＝最終ページの先）は空のリストを返す
+                print(f"情報: {target_url} で商品リンクが見つかりませんでした。詳細: {e}")
+                return [], total_hits
+
+            # 描画後のHTMLを、HTTP経路と同じパーサで解析する
+            parsed = parse_search_html(await page.content())
+            if parsed is None:
+                print(f"⚠️ {target_url} の商品一覧を解析できませんでした。")
+            return parsed
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ {target_url} を開けませんでした。詳細: {e}")
+            return None
+
+        finally:
+            await page.close()
+
+    async def fetch_products(self, target_url: str, delay: float = 0.0) -> list[dict] | None:
+        """
+        検索結果ページ1ページ分の商品レコードを取得する。
+
+        Args:
+            target_url: Yahoo!ショッピングの検索結果ページのURL
+            delay: 取得を始める前に待つ秒数（取得し直すとき用）
+
+        Returns:
+            商品レコードのリスト（最終ページの先では空）。取得に失敗した場合は None
+        """
+        if delay:
+            await asyncio.sleep(delay)
+        result = await self.fetch_page(target_url)
+        return None if result is None else result[0]
+
+    async def fetch_links(self, target_url: str) -> set[str]:
+        """検索結果ページ1ページ分の商品リンクを収集する"""
+        return {product["url"] for product in await self.fetch_products(target_url) or []}
+
+    @staticmethod
+    def _page_failed(products: list[dict] | None, page_num: int, page_count: int | None) -> bool:
+        """
+        ページの取得に失敗したか。取得できなかったページと、総件数から後ろにまだページがあると
+        分かっているのに空だったページを失敗とみなす（最終ページの先として巡回を終えてはいけない）
+        """
+        return products is None or (not products and page_count is not None and page_num < page_count)
+
+    async def iter_products(self, base_url: str, max_pages: int | None = None):
+        """
+        検索結果の全ページを window ページずつ並行に取得し、
+        ページを解析するたびに、まだ返していない商品のレコードを1件ずつ返す非同期イテレータ。
+
+        まず1ページ目だけを取得して検索結果の総件数を読み取り、
+        ページ数を確定させてから残りのページを並行に取得する（最終ページの先は取得しない）。
+        総件数が読み取れない場合は、最初に空だったページを終端とみなし、
+        新しいページの投入を止め、終端より後ろで実行中の取得はキャンセルする。
+        取得に失敗したページは page_attempts 回まで取得し直し、それでも取れなければ RuntimeError を送出する
+        （途中のページが抜けたまま、全件を見たことにしない）。
+
+        Args:
+            base_url: Yahoo!ショッピングの検索URL（b= パラメータなし）
+            max_pages: 取得するページ数の上限（Noneなら最終ページまで）
+
+        Yields:
+            商品レコード {"url", "title", "price", "store", "thumbnail"}（ページの完了順）。
+            "url" は重複を除去し、正規化した商品詳細ページのURL
+        """
+        product_index = self.product_index
+
+        first_url = build_search_page_url(base_url, 1)
+        print(f"--- ページ 1 の収集を開始: {first_url}")
+        for attempt in range(1, self.page_attempts + 1):
+            result = await self.fetch_page(first_url)
+            first_products, total_hits = result if result is not None else (None, None)
+            page_count = count_search_pages(total_hits) if total_hits is not None else None
+            if not self._page_failed(first_products, 1, page_count):
+                break
+            if attempt == self.page_attempts:
+                raise RuntimeError(f"検索結果のページ 1 を取得できませんでした（{self.page_attempts}回試行）: {first_url}")
+            print(f"⚠️ ページ 1 の取得に失敗しました。取得し直します（{attempt}/{self.page_attempts}回目）。")
+            await asyncio.sleep(self.retry_delay * attempt)
+
+        if not first_products:
+            print("ページ 1 でリンクが見つかりませんでした。収集を終了します。")
+            return
+
+        print(f"ページ 1 で {len(first_products)} 件のリンクを発見。")
+        for product in first_products:
+            product_url = product_index.add(product["url"])
+            if product_url:
+                yield {**product, "url": product_url}
+
+        if page_count is not None:
+            print(f"検索結果は {total_hits} 件（全 {page_count} ページ）です。")
+            max_pages = page_count if max_pages is None else min(max_pages, page_count)
+        else:
+            print("検索結果の総件数が読み取れませんでした。空のページが出るまで収集します。")
+
+        in_flight: dict[int, asyncio.Task] = {}
+        attempts: dict[int, int] = {}  # ページ番号ごとの取得を試みた回数
+        next_page = 2
+        last_page = None  # 最初に空だったページ番号
+
+        try:
+            while True:
+                # ウィンドウに空きがあれば次のページを投入する
+                while (
+                    last_page is None
+                    and len(in_flight) < self.window
+                    and (max_pages is None or next_page <= max_pages)
+                ):
+                    url = build_search_page_url(base_url, next_page)
+                    print(f"--- ページ {next_page} の収集を開始: {url}")
+                    in_flight[next_page] = asyncio.create_task(self.fetch_products(url))
+                    attempts[next_page] = 1
+                    next_page += 1
+
+                if not in_flight:
+                    break
+
+                done, _ = await asyncio.wait(in_flight.values(), return_when=asyncio.FIRST_COMPLETED)
+
+                # ページ番号の小さい順に処理し、空ページより後ろの結果は採用しない
+                for page_num in sorted(n for n, task in in_flight.items() if task in done):
+                    # 先に処理した空ページより後ろとして取り除いた（キャンセルした）ページは飛ばす
+                    task = in_flight.pop(page_num, None)
+                    if task is None:
+                        continue
+                    products = task.result()
+
+                    if last_page is not None and page_num > last_page:
+                        continue
+
+                    # 取得に失敗したページは、終端とみなさずに取得し直す（取り直せなければ巡回を止める）
+                    if self._page_failed(products, page_num, page_count):
+                        url = build_search_page_url(base_url, page_num)
+                        if attempts[page_num] >= self.page_attempts:
+                            raise RuntimeError(
+                                f"検索結果のページ {page_num} を取得できませんでした（{self.page_attempts}回試行）: {url}"
+                            )
+                        print(f"⚠️ ページ {page_num} の取得に失敗しました。取得し直します"
+                              f"（{attempts[page_num]}/{self.page_attempts}回目）。")
+                        in_flight[page_num] = asyncio.create_task(
+                            self.fetch_products(url, delay=self.retry_delay * attempts[page_num])
+                        )
+                        attempts[page_num] += 1
+                        continue
+
+                    if not products:
+                        print(f"ページ {page_num} でリンクが見つかりませんでした。以降のページの収集を終了します。")
+                        last_page = page_num
+                        for later_page in [n for n in in_flight if n > page_num]:
+                            in_flight.pop(later_page).cancel()
+                        continue
+
+                    print(f"ページ {page_num} で {len(products)} 件のリンクを発見。")
+                    for product in products:
+                        product_url = product_index.add(product["url"])
+                        if product_url:
+                            yield {**product, "url": product_url}
+
+        finally:
+            # 途中で例外が出た場合や、呼び出し側が途中で読むのをやめた場合も、実行中のタスクを残さない
+            for task in in_flight.values():
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight.values(), return_exceptions=True)
+
+    async def iter_links(self, base_url: str, max_pages: int | None = None):
+        """iter_products の商品URLだけを返す非同期イテレータ"""
+        async for product in self.iter_products(base_url, max_pages):
+            yield product["url"]
+
+    async def collect(self, base_url: str, max_pages: int | None = None) -> set[str]:
+        """
+        iter_links の結果をすべて集めて返す。
+
+        Args:
+            base_url: Yahoo!ショッピングの検索URL（b= パラメータなし）
+            max_pages: 取得するページ数の上限（Noneなら最終ページまで）
+
+        Returns:
+            全ページ分の、重複を除去した商品詳細ページのURLのセット
+        """
+        return {link async for link in self.iter_links(base_url, max_pages)}
+
+
+async def _run_paginator(
+    base_url: str,
+    window: int,
+    use_http: bool,
+    stats: FetchStats | None,
+    request_filter: RequestFilter | None,
+    on_product,
+):
+    """
+    YahooSearchPaginator を起動して全ページを巡回し、見つかった商品レコードごとに on_product を呼ぶ。
+    on_product が False を返したら巡回を打ち切る。
+    """
+    http_fetcher = YahooHttpFetcher() if use_http else None
+    try:
+        async with YahooSearchPaginator(
+            window=window,
+            http_fetcher=http_fetcher,
+            stats=stats,
+            request_filter=request_filter,
+        ) as paginator:
+            async for product in paginator.iter_products(base_url):
+                if on_product(product) is False:
+                    break
+            print(f"検索ページの取得経路: {paginator.stats.summary()}")
+            print(f"商品リンクの重複排除: {paginator.product_index.summary()}")
+            if paginator.request_filter.blocked_requests:
+                print(f"リクエストフィルタ: {paginator.request_filter.summary()}")
+    finally:
+        if http_fetcher is not None:
+            http_fetcher.close()
+
+
+def collect_yahoo_links(
+    base_url: str,
+    window: int = DEFAULT_PAGE_WINDOW,
+    use_http: bool = True,
+    stats: FetchStats | None = None,
+    request_filter: RequestFilter | None = None,
+) -> set[str]:
+    """
+    同期コードから呼び出すためのラッパー。
+    YahooSearchPaginator で全ページを並行に収集し、商品リンクのセットを返す。
+
+    Args:
+        base_url: Yahoo!ショッピングの検索URL（b= パラメータなし）
+        window: 同時に取得するページ数
+        use_http: ブラウザを使わないHTTPの高速経路を先に試すかどうか
+        stats: 取得経路を記録するカウンタ（省略時は内部で作成）
+        request_filter: ブラウザで開くときのリクエストフィルタ（省略時は既定のポリシー）
+
+    Returns:
+        全ページ分の、重複を除去した商品詳細ページのURLのセット
+    """
+    all_links = set()
+    asyncio.run(_run_paginator(
+        base_url, window, use_http, stats, request_filter,
+        lambda product: all_links.add(product["url"]),
+    ))
+    return all_links
+
+
+def stream_yahoo_products(
+    base_url: str,
+    window: int = DEFAULT_PAGE_WINDOW,
+    use_http: bool = True,
+    stats: FetchStats | None = None,
+    request_filter: RequestFilter | None = None,
+):
+    """
+    同期コードから呼び出すためのジェネレータ版。
+    バックグラウンドのスレッドで検索ページを巡回し、
+    ページを解析するたびに重複を除去した商品レコードを1件ずつ返す。
+    全ページの収集を待たずに、後段の処理（サイズチェックなど）を始められる。
+
+    Args:
+        collect_yahoo_links と同じ
+
+    Yields:
+        商品レコード {"url", "title", "price", "store", "thumbnail"}
+    """
+    product_queue: queue.Queue = queue.Queue()
+    stop_event = threading.Event()
+    finished = object()
+
+    def on_product(product: dict) -> bool:
+        product_queue.put(product)
+        return not stop_event.is_set()
+
+    def run():
+        try:
+            asyncio.run(_run_paginator(base_url, window, use_http, stats, request_filter, on_product))
+        except Exception as e:
+            product_queue.put(e)
         finally:
-            browser.close()
+            product_queue.put(finished)
+
+    worker = threading.Thread(target=run, name="yahoo-paginator", daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            item = product_queue.get()
+            if item is finished:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # 呼び出し側が途中で読むのをやめた場合は、次の商品で巡回を打ち切る
+        stop_event.set()
+        worker.join()
+
+
+def stream_yahoo_links(
+    base_url: str,
+    window: int = DEFAULT_PAGE_WINDOW,
+    use_http: bool = True,
+    stats: FetchStats | None = None,
+    request_filter: RequestFilter | None = None,
+):
+    """
+    stream_yahoo_products の商品URLだけを返すジェネレータ。
+
+    Yields:
+        重複を除去し、正規化した商品詳細ページのURL
+    """
+    for product in stream_yahoo_products(base_url, window, use_http, stats, request_filter):
+        yield product["url"]
 
-    return product_links
 
 # ---------------------------------------------------------------------------
-# ▼▼▼ ステップ2：メインの実行部分（whileループ）▼▼▼
-# (この 'if' ブロックが、上記の 'fetch_yahoo_links_playwright' 関数を呼び出す)
+# ▼▼▼ ステップ2：メインの実行部分（並行ページ取得）▼▼▼
+# (この 'if' ブロックが、上記の 'collect_yahoo_links' を使って全ページを巡回する)
 # ---------------------------------------------------------------------------
 if __name__ == "__main__":
-    
+
     # 検索クエリの基本URL
     BASE_SEARCH_URL = "https://shopping.yahoo.co.jp/search?p=%E3%83%87%E3%82%A3%E3%83%BC%E3%82%BC%E3%83%AB%E3%82%AD%E3%83%83%E3%82%BA+%E3%82%A2%E3%82%A6%E3%83%88%E3%83%AC%E3%83%83%E3%83%88"
-    
-    ITEMS_PER_PAGE = 30  # 1ページあたりのアイテム数
-    
-    # 収集した全リンクを保存するセット
-    all_product_links = set()
-
-    page_num = 1 # 1ページ目からスタート
-    
-    print("存在するすべてのページのリンクを収集します...")
-
-    # while True: 処理が「止まれ(break)」と言うまで永遠にループ
-    while True: 
-        
-        start_index = (page_num - 1) * ITEMS_PER_PAGE + 1
-        url_to_scrape = f"{BASE_SEARCH_URL}&b={start_index}"
-        
-        print(f"\n--- ページ {page_num} (b={start_index}) の収集を開始 ---")
-        
-        # ★エラーが発生した箇所★
-        # 上で定義した 'fetch_yahoo_links_playwright' 関数をここで呼び出す
-        links_from_page = fetch_yahoo_links_playwright(url_to_scrape)
-        
-        # --- 停止条件 ---
-        if not links_from_page:
-            print(f"ページ {page_num} でリンクが見つかりませんでした。収集を終了します。")
-            break # while True ループを抜ける
-        
-        print(f"ページ {page_num} で {len(links_from_page)} 件のリンクを発見。")
-        all_product_links.update(links_from_page)
-        
-        page_num += 1 
-        time.sleep(1) 
-
-    # --- ループ終了 ---
+
+    # 同時に取得するページ数（コマンドライン引数で変更可）
+    page_window = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAGE_WINDOW
+
+    print(f"存在するすべてのページのリンクを収集します（同時取得: {page_window}ページ）...")
+
+    started_at = time.time()
+    all_product_links = collect_yahoo_links(BASE_SEARCH_URL, window=page_window)
+
+    # --- 収集終了 ---
 
     if all_product_links:
-        print(f"\n--- 収集完了 ---")
+        print(f"\n--- 収集完了 ({time.time() - started_at:.1f}秒) ---")
         print(f"合計 {len(all_product_links)} 件のユニークな商品リンクが見つかりました。")
     else:
-        print("商品リンクの収集に失敗しました。")
\ No newline at end of file
+        print("商品リンクの収集に失敗しました。")
@@ -1,11 +1,17 @@
 # Access Deniedになるため、ZOZOにアクセスすることは困難
 
+import os
+import sys
 import time
 # playwright_stealth はもう使いません
 from playwright.sync_api import sync_playwright
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.scrapers.request_filter import RequestFilter
+
 def fetch_product_links_playwright(target_url: str) -> set[str]:
     base_url = "https://zozo.jp"
     product_links = set()
@@ -18,6 +24,8 @@ def fetch_product_links_playwright(target_url: str) -> set[str]:
         context = browser.new_context(
             user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         )
+        # 画像・フォント・広告タグなどは読み込まない
+        RequestFilter().install(context)
         page = context.new_page()
 
         try:
@@ -0,0 +1,75 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.fashion_diesel_kids.size_rules import AVAILABLE, UNAVAILABLE, UNKNOWN, classify_size_availability
+
+
+def test_variant_rows_are_read_per_size():
+    text = "サイズを選択\n10Y 在庫あり\n12Y ×\n14Y 残り1点\n16Y 品切れ"
+    assert classify_size_availability(text) == (AVAILABLE, ["14Y"])
+
+
+def test_all_target_sizes_sold_out():
+    text = "14Y SOLD OUT\n16Y 在庫なし\n12Y ○"
+    assert classify_size_availability(text) == (UNAVAILABLE, [])
+
+
+def test_structured_data_availability_is_not_a_size_verdict():
+    text = (
+        "--- 構造化データ ---\n"
+        "商品名: DIESEL KIDS デニムパンツ 14Y\n"
+        "販売情報: 価格=5990 在庫=InStock\n"
+        "--- ページ本文 ---\n"
+        "DIESEL KIDS デニムパンツ"
+    )
+    assert classify_size_availability(text) == (UNKNOWN, [])
+
+
+def test_marker_on_the_next_line_is_not_paired_with_a_size():
+    text = "関連商品\nDIESEL KIDS ロゴTシャツ ブラック 14Y\n在庫あり ¥3,990"
+    assert classify_size_availability(text) == (UNKNOWN, [])
+
+
+def test_restock_notice_is_not_sold_out():
+    assert classify_size_availability("14Y 再入荷しました") == (UNKNOWN, [])
+
+
+def test_dimension_separator_in_size_chart_is_not_sold_out():
+    text = "サイズ表\n14Y 着丈65×身幅50\n16Y 着丈70✕身幅53"
+    assert classify_size_availability(text) == (UNKNOWN, [])
+
+
+def test_stock_symbol_right_after_size_is_read():
+    text = "14Y：×\n16Y ×\n12Y ○"
+    assert classify_size_availability(text) == (UNAVAILABLE, [])
+    assert classify_size_availability("14Y ×\n16Y / ○") == (AVAILABLE, ["16Y"])
+
+
+def test_related_items_do_not_imply_size_absence():
+    text = "この商品を見た人はこんな商品も見ています\n8Y ロゴTシャツ\n10Y デニム\n12Y パーカー"
+    assert classify_size_availability(text) == (UNKNOWN, [])
+
+
+def test_small_size_chart_does_not_imply_size_absence():
+    text = "サイズ表\n4Y 身長105 着丈40\n6Y 身長115 着丈44\n8Y 身長125 着丈48\n10Y 身長135 着丈52"
+    assert classify_size_availability(text) == (UNKNOWN, [])
+
+
+def test_stock_table_without_target_sizes_implies_absence():
+    text = "サイズを選択\n8Y 在庫あり\n10Y ×\n12Y 残り2点"
+    assert classify_size_availability(text) == (UNAVAILABLE, [])
+
+
+def test_structured_offers_per_size():
+    text = (
+        "--- 構造化データ ---\n"
+        "商品名: DIESEL KIDS デニムパンツ\n"
+        "販売情報: 12Y 価格=5990 在庫=InStock\n"
+        "販売情報: 14Y 価格=5990 在庫=OutOfStock\n"
+        "販売情報: 16Y 価格=5990 在庫=InStock\n"
+        "--- ページ本文 ---\n"
+        "DIESEL KIDS デニムパンツ"
+    )
+    assert classify_size_availability(text) == (AVAILABLE, ["16Y"])
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("playwright")
+
+from common.scrapers.yahoo import YahooSearchPaginator
+
+
+class FakePaginator(YahooSearchPaginator):
+    """
+    検索結果ページの取得を、ページ番号ごとに決めた商品のリストで置き換えたもの。
+    failures に指定したページは、その回数だけ取得に失敗する（None を返す）。
+    """
+
+    def __init__(
+        self,
+        pages: dict[int, list[dict]],
+        delays: dict[int, float] | None = None,
+        total_hits: int | None = None,
+        failures: dict[int, int] | None = None,
+        window: int = 4,
+    ):
+        super().__init__(window=window, retry_delay=0.0)
+        self.pages = pages
+        self.delays = delays or {}
+        self.total_hits = total_hits
+        self.failures = dict(failures or {})
+        self._entered = True
+
+    @staticmethod
+    def _page_num(url: str) -> int:
+        start_index = int(url.rsplit("b=", 1)[1]) if "b=" in url else 1
+        return (start_index - 1) // 30 + 1
+
+    async def fetch_page(self, target_url: str):
+        page_num = self._page_num(target_url)
+        await asyncio.sleep(self.delays.get(page_num, 0))
+        if self.failures.get(page_num):
+            self.failures[page_num] -= 1
+            return None
+        return self.pages.get(page_num, []), self.total_hits
+
+
+def make_products(page_num: int, count: int = 30) -> list[dict]:
+    return [
+        {"url": f"https://store.shopping.yahoo.co.jp/store/item{page_num}-{number}.html", "title": f"商品 {page_num}-{number}"}
+        for number in range(count)
+    ]
+
+
+def collect_urls(paginator: YahooSearchPaginator) -> list[str]:
+    async def run():
+        return [product["url"] async for product in paginator.iter_products("https://shopping.yahoo.co.jp/search?p=x")]
+
+    return asyncio.run(run())
+
+
+def test_several_empty_pages_finishing_together_end_the_crawl():
+    # 総件数が分からず、ページ 3〜5 が空で同時に終わる（ページ 2 はそれより遅れて終わる）
+    paginator = FakePaginator(pages={1: make_products(1), 2: make_products(2)}, delays={2: 0.05})
+
+    urls = collect_urls(paginator)
+
+    assert len(urls) == 60
+    assert len(set(urls)) == 60
+
+
+def test_pages_after_the_first_empty_page_are_ignored():
+    paginator = FakePaginator(
+        pages={1: make_products(1), 2: make_products(2), 4: make_products(4)},
+        delays={2: 0.05, 4: 0.0},
+    )
+
+    urls = collect_urls(paginator)
+
+    assert len(urls) == 60
+    assert not any("item4-" in url for url in urls)
+
+
+def test_failed_middle_page_is_fetched_again():
+    # 300件（10ページ）のうち、ページ 3 の取得が1回失敗する
+    paginator = FakePaginator(
+        pages={page_num: make_products(page_num) for page_num in range(1, 11)},
+        total_hits=300,
+        failures={3: 1},
+    )
+
+    urls = collect_urls(paginator)
+
+    assert len(set(urls)) == 300
+
+
+def test_middle_page_that_keeps_failing_stops_the_crawl_with_an_error():
+    paginator = FakePaginator(
+        pages={page_num: make_products(page_num) for page_num in range(1, 11) if page_num != 3},
+        total_hits=300,
+    )
+
+    with pytest.raises(RuntimeError, match="ページ 3"):
+        collect_urls(paginator)
+
+
+def test_failed_page_is_not_the_end_when_total_hits_is_unknown():
+    paginator = FakePaginator(
+        pages={1: make_products(1), 2: make_products(2), 3: make_products(3)},
+        failures={2: 2},
+    )
+
+    urls = collect_urls(paginator)
+
+    assert len(set(urls)) == 90
+
+
+def test_total_hits_prefers_explicit_count_over_no_results_text_in_scripts():
+    from common.scrapers.yahoo import parse_total_hits
+
+    html = (
+        '<script>window.__DATA__ = {"totalResultsAvailable":500,'
+        '"messages":{"empty":"該当する商品はありません"}}</script><div>商品一覧</div>'
+    )
+    assert parse_total_hits(html) == 500
+
+
+def test_total_hits_reads_no_results_marker_from_visible_text_only():
+    from common.scrapers.yahoo import parse_total_hits
+
+    assert parse_total_hits("<p>該当する商品はありません</p>") == 0
+    assert parse_total_hits('<script>var m = "該当する商品はありません";</script><p>商品一覧</p>') is None
+    assert parse_total_hits('<script>{"totalCount": 3}</script><p>1,234件の商品</p>') == 1234
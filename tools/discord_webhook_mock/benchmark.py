@@ -0,0 +1,156 @@
+"""
+common/discord.py の通知を、ローカルの Discord Webhook のモックに送って測るベンチマーク。
+
+商品の件数ごと（既定は 10 / 100 / 1000 件）に、すべての商品が届くまでの時間・メッセージ数・
+429 / 5xx の回数・送り直した回数と、届いた商品に抜け・重複・形式の誤り（400）がないかを表にして出す。
+モックの遅延・エラーの割合・レート制限は引数で変えられる（乱数のシードを固定すれば同じ条件で繰り返せる）。
+
+使い方:
+    PYTHONPATH=. python tools/discord_webhook_mock/benchmark.py
+    PYTHONPATH=. python tools/discord_webhook_mock/benchmark.py --items 10 100 1000 --compact --latency 0.05 --failure-rate 0.05
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.discord import DiscordWebhookClient, StreamingDiscordNotifier, send_discord_notification
+from tools.discord_webhook_mock.server import MockDiscordWebhookServer
+
+# 商品リンクの一覧（compact）のembedから、商品URLを取り出す
+LINK_PATTERN = re.compile(r"\]\((https?://[^)\s]+)\)")
+
+
+def make_items(count: int) -> list[dict]:
+    """ベンチマーク用の商品レコード（タイトルの長さをばらつかせ、embedの文字数の上限にかかるようにする）"""
+    return [
+        {
+            "url": f"https://store.shopping.yahoo.co.jp/mock-store/item{number:05d}.html",
+            "title": f"DIESEL KIDS ディーゼルキッズ テスト商品 {number} " + "デニム パンツ ロゴ " * (number % 12),
+            "price": 3990 + number * 10,
+            "store": "mock-store",
+            "sizes": ["14Y", "16Y"] if number % 2 else ["14Y"],
+        }
+        for number in range(1, count + 1)
+    ]
+
+
+def delivered_urls(messages: list[dict]) -> list[str]:
+    """モックが受け取ったメッセージから、届いた商品のURLを順に取り出す"""
+    urls = []
+    for message in messages:
+        for embed in message["payload"].get("embeds") or []:
+            if embed.get("url"):
+                urls.append(embed["url"])
+            else:
+                urls.extend(LINK_PATTERN.findall(embed.get("description", "")))
+    return urls
+
+
+def run_case(mock: MockDiscordWebhookServer, count: int, args) -> dict:
+    """count 件の商品を送り、結果をまとめる"""
+    mock.reset()
+    items = make_items(count)
+    client = DiscordWebhookClient(backoff_base=args.backoff_base, backoff_max=args.backoff_max)
+    webhook_url = mock.webhook_url(f"bench-{count}")
+
+    started = time.monotonic()
+    if args.mode == "stream":
+        notifier = StreamingDiscordNotifier(
+            webhook_url,
+            max_latency_seconds=args.max_latency,
+            client=client,
+            compact=args.compact,
+        )
+        for item in items:
+            notifier.add(item)
+        notifier.close()
+    else:
+        send_discord_notification(webhook_url, items, client=client, compact=args.compact)
+    elapsed = time.monotonic() - started
+    client.close()
+
+    urls = delivered_urls(mock.messages)
+    expected = {item["url"] for item in items}
+    stats = mock.stats()["status_counts"]
+    return {
+        "items": count,
+        "seconds": elapsed,
+        "items_per_second": count / elapsed if elapsed else float("inf"),
+        "messages": len(mock.messages),
+        "rate_limited": stats.get("429", 0),
+        "server_errors": sum(stats.get(str(status), 0) for status in (500, 502, 503)),
+        "invalid": stats.get("400", 0),
+        "retries": client.retries,
+        "wait_seconds": client.rate_limit_wait_seconds,
+        "missing": len(expected - set(urls)),
+        "duplicates": len(urls) - len(set(urls)),
+    }
+
+
+def format_table(results: list[dict]) -> str:
+    """結果を表にする"""
+    header = ("件数", "秒", "件/秒", "メッセージ", "429", "5xx", "400", "再送", "待ち秒", "抜け", "重複")
+    rows = [
+        (
+            str(result["items"]),
+            f"{result['seconds']:.2f}",
+            f"{result['items_per_second']:.1f}",
+            str(result["messages"]),
+            str(result["rate_limited"]),
+            str(result["server_errors"]),
+            str(result["invalid"]),
+            str(result["retries"]),
+            f"{result['wait_seconds']:.1f}",
+            str(result["missing"]),
+            str(result["duplicates"]),
+        )
+        for result in results
+    ]
+    widths = [max(len(row[index]) for row in rows + [header]) for index in range(len(header))]
+    lines = [" | ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in [header] + rows]
+    lines.insert(1, "-+-".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discord通知をローカルのWebhookのモックに送って測る")
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000], help="送る商品の件数（複数指定可）")
+    parser.add_argument("--mode", choices=("stream", "batch"), default="stream",
+                        help="stream: StreamingDiscordNotifier / batch: send_discord_notification")
+    parser.add_argument("--compact", action="store_true", help="商品リンクの一覧で送る")
+    parser.add_argument("--max-latency", type=float, default=0.5, help="stream のときに溜めて待つ最大秒数")
+    parser.add_argument("--rate-limit", type=int, default=5, help="モック: Webhookごとに window 秒あたり送れる回数")
+    parser.add_argument("--window", type=float, default=2.0, help="モック: レート制限の期間（秒）")
+    parser.add_argument("--global-rate-limit", type=int, default=None, help="モック: 全体で1秒あたり送れる回数")
+    parser.add_argument("--latency", type=float, default=0.0, help="モック: 応答までの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="モック: 遅延に足すゆらぎの上限（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="モック: サーバーエラーを返す割合（0〜1）")
+    parser.add_argument("--seed", type=int, default=1, help="モック: 乱数のシード")
+    parser.add_argument("--backoff-base", type=float, default=1.0, help="クライアント: 指数バックオフの基準の秒数")
+    parser.add_argument("--backoff-max", type=float, default=30.0, help="クライアント: 指数バックオフの上限の秒数")
+    args = parser.parse_args()
+
+    with MockDiscordWebhookServer(
+        rate_limit=args.rate_limit,
+        window_seconds=args.window,
+        global_rate_limit=args.global_rate_limit,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    ) as mock:
+        print(f"モック: {mock.base_url}（{args.rate_limit}回 / {args.window:g}秒、遅延 {args.latency:g}秒、"
+              f"エラー {args.failure_rate:.0%}） / 送信方法: {args.mode}{'（compact）' if args.compact else ''}")
+        results = []
+        for count in args.items:
+            print(f"\n--- {count} 件 ---")
+            results.append(run_case(mock, count, args))
+
+    print("\n" + format_table(results))
+    if any(result["missing"] or result["duplicates"] or result["invalid"] for result in results):
+        print("\n⚠️ 抜け・重複・形式の誤りがありました。")
+        sys.exit(1)
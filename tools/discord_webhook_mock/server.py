@@ -0,0 +1,344 @@
+"""
+Discord Webhook の代わりに使う、ローカルのHTTPサーバー（負荷・遅延のテスト用）。
+
+本物のWebhookと同じように振る舞う:
+    - メッセージの形式と、embedの数・文字数の上限を確かめ、違反していれば 400 を返す
+    - Webhookごとのバケットでレート制限をかけ、X-RateLimit-* ヘッダーを返す
+      （上限を超えたら 429 と Retry-After / retry_after を返す。global の制限も付けられる）
+    - 応答の遅延と、一定の割合のサーバーエラー（500 / 502 / 503）を混ぜられる
+
+受け取ったメッセージは記録しておき、GET /_mock/stats で件数、GET /_mock/messages で中身を確認できる。
+POST /_mock/reset で記録とレート制限の状態を消す。
+
+使い方:
+    python tools/discord_webhook_mock/server.py --port 8765 --latency 0.05 --failure-rate 0.05
+    # Webhook URL: http://127.0.0.1:8765/api/webhooks/1/token
+
+    with MockDiscordWebhookServer(latency=0.05) as server:
+        webhook_url = server.webhook_url("family")
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Discordの制限（メッセージ・embedの文字数と数）
+MESSAGE_CONTENT_CHARS = 2000
+EMBEDS_PER_MESSAGE = 10
+EMBED_TOTAL_CHARS = 6000
+EMBED_TITLE_CHARS = 256
+EMBED_DESCRIPTION_CHARS = 4096
+EMBED_FOOTER_CHARS = 2048
+EMBED_AUTHOR_CHARS = 256
+EMBED_FIELDS = 25
+EMBED_FIELD_NAME_CHARS = 256
+EMBED_FIELD_VALUE_CHARS = 1024
+
+WEBHOOK_PATH = re.compile(r"^/api(?:/v\d+)?/webhooks/([^/]+)/([^/?]+)$")
+
+
+def validate_payload(payload) -> dict:
+    """
+    Webhookに送るメッセージの形式と上限を確かめる。
+
+    Returns:
+        違反した項目 → 内容 の辞書（問題がなければ空）
+    """
+    if not isinstance(payload, dict):
+        return {"payload": "JSONのオブジェクトではありません"}
+
+    errors = {}
+    content = payload.get("content") or ""
+    embeds = payload.get("embeds") or []
+    if not content and not embeds:
+        errors["payload"] = "content と embeds のどちらもありません"
+    if len(content) > MESSAGE_CONTENT_CHARS:
+        errors["content"] = f"{len(content)} 文字（上限 {MESSAGE_CONTENT_CHARS}）"
+    if len(embeds) > EMBEDS_PER_MESSAGE:
+        errors["embeds"] = f"{len(embeds)} 個（上限 {EMBEDS_PER_MESSAGE}）"
+
+    total = 0
+    for index, embed in enumerate(embeds):
+        limits = (
+            ("title", embed.get("title", ""), EMBED_TITLE_CHARS),
+            ("description", embed.get("description", ""), EMBED_DESCRIPTION_CHARS),
+            ("footer.text", (embed.get("footer") or {}).get("text", ""), EMBED_FOOTER_CHARS),
+            ("author.name", (embed.get("author") or {}).get("name", ""), EMBED_AUTHOR_CHARS),
+        )
+        for name, text, limit in limits:
+            total += len(text)
+            if len(text) > limit:
+                errors[f"embeds.{index}.{name}"] = f"{len(text)} 文字（上限 {limit}）"
+
+        fields = embed.get("fields") or []
+        if len(fields) > EMBED_FIELDS:
+            errors[f"embeds.{index}.fields"] = f"{len(fields)} 個（上限 {EMBED_FIELDS}）"
+        for field_index, field in enumerate(fields):
+            name, value = field.get("name", ""), field.get("value", "")
+            total += len(name) + len(value)
+            if len(name) > EMBED_FIELD_NAME_CHARS:
+                errors[f"embeds.{index}.fields.{field_index}.name"] = f"{len(name)} 文字（上限 {EMBED_FIELD_NAME_CHARS}）"
+            if len(value) > EMBED_FIELD_VALUE_CHARS:
+                errors[f"embeds.{index}.fields.{field_index}.value"] = f"{len(value)} 文字（上限 {EMBED_FIELD_VALUE_CHARS}）"
+
+    if total > EMBED_TOTAL_CHARS:
+        errors["embeds"] = f"embedの合計 {total} 文字（上限 {EMBED_TOTAL_CHARS}）"
+    return errors
+
+
+class MockDiscordWebhookServer:
+    """
+    Discord Webhook の代わりのHTTPサーバー。start() でバックグラウンドのスレッドで動かす。
+
+    Args:
+        rate_limit: 1つのWebhook（バケット）に window_seconds 秒あたり送れる回数
+        window_seconds: レート制限の期間（秒）
+        global_rate_limit: すべてのWebhookを合わせて1秒あたり送れる回数（None なら制限なし）
+        latency: 応答までの遅延（秒）
+        jitter: 遅延に足すゆらぎの上限（秒）
+        failure_rate: サーバーエラー（500 / 502 / 503）を返す割合（0〜1）
+        seed: 遅延・エラーの乱数のシード（同じ条件で繰り返し測るため）
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate_limit: int = 5,
+        window_seconds: float = 2.0,
+        global_rate_limit: int | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.rate_limit = rate_limit
+        self.window_seconds = window_seconds
+        self.global_rate_limit = global_rate_limit
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+        self.reset()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def webhook_url(self, name: str = "1") -> str:
+        """このサーバーのWebhook URL（name ごとに別のバケットになる）"""
+        return f"{self.base_url}/api/webhooks/{name}/mock-token"
+
+    def start(self) -> str:
+        """バックグラウンドで起動し、ベースURLを返す"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="discord-webhook-mock", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        """受け取ったメッセージ・統計・レート制限の状態を消す"""
+        with self._lock:
+            # バケットID → (期間の始まりの時刻, 期間内に受け付けた回数)
+            self._buckets: dict[str, tuple[float, int]] = {}
+            self._global_window: tuple[float, int] = (0.0, 0)
+            self.messages: list[dict] = []
+            self.status_counts = Counter()
+            self.validation_errors: list[dict] = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "messages": len(self.messages),
+                "status_counts": {str(status): count for status, count in sorted(self.status_counts.items())},
+                "validation_errors": len(self.validation_errors),
+            }
+
+    def handle_webhook(self, route: str, payload) -> tuple[int, dict, dict | None]:
+        """
+        Webhookへの1回のPOSTを処理する。
+
+        Returns:
+            (ステータス, ヘッダー, レスポンスのJSON（なければ None）)
+        """
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            now = time.monotonic()
+
+            # すべてのWebhookを合わせた制限（1秒ごとの期間）
+            if self.global_rate_limit is not None:
+                started, count = self._global_window
+                if now - started >= 1.0:
+                    started, count = now, 0
+                if count >= self.global_rate_limit:
+                    retry_after = max(0.001, 1.0 - (now - started))
+                    return self._rate_limited(retry_after, {}, is_global=True)
+                self._global_window = (started, count + 1)
+
+            # Webhookごとのバケット（window_seconds 秒ごとの期間）
+            bucket = hashlib.sha1(route.encode("utf-8")).hexdigest()[:16]
+            started, count = self._buckets.get(bucket, (now, 0))
+            if now - started >= self.window_seconds:
+                started, count = now, 0
+            reset_after = max(0.001, self.window_seconds - (now - started))
+            headers = {
+                "X-RateLimit-Bucket": bucket,
+                "X-RateLimit-Limit": str(self.rate_limit),
+                "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+                "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            }
+            if count >= self.rate_limit:
+                headers["X-RateLimit-Remaining"] = "0"
+                return self._rate_limited(reset_after, headers, is_global=False)
+            self._buckets[bucket] = (started, count + 1)
+            headers["X-RateLimit-Remaining"] = str(self.rate_limit - count - 1)
+
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                status = self._random.choice((500, 502, 503))
+                self.status_counts[status] += 1
+                return status, headers, {"message": "injected failure", "code": 0}
+
+            errors = validate_payload(payload)
+            if errors:
+                self.status_counts[400] += 1
+                self.validation_errors.append({"route": route, "errors": errors})
+                return 400, headers, {"message": "Invalid Form Body", "code": 50035, "errors": errors}
+
+            self.status_counts[204] += 1
+            self.messages.append({"route": route, "received_at": time.time(), "payload": payload})
+            return 204, headers, None
+
+    def _rate_limited(self, retry_after: float, headers: dict, is_global: bool) -> tuple[int, dict, dict]:
+        # 呼び出し元で self._lock を取得済み
+        self.status_counts[429] += 1
+        headers = {
+            **headers,
+            "Retry-After": str(math.ceil(retry_after)),
+            "X-RateLimit-Scope": "global" if is_global else "user",
+        }
+        if is_global:
+            headers["X-RateLimit-Global"] = "true"
+        return 429, headers, {"message": "You are being rate limited.", "retry_after": round(retry_after, 3), "global": is_global}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/_mock/reset":
+                    server.reset()
+                    self._respond(204, {}, None)
+                    return
+
+                match = WEBHOOK_PATH.match(path)
+                if match is None:
+                    self._respond(404, {}, {"message": "Unknown Webhook", "code": 10015})
+                    return
+
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"null")
+                except json.JSONDecodeError:
+                    self._respond(400, {}, {"message": "Invalid JSON", "code": 50109})
+                    return
+
+                status, headers, body = server.handle_webhook("/".join(match.groups()), payload)
+                # ?wait=true のときは、本物と同じく 200 で作ったメッセージを返す
+                if status == 204 and "wait=true" in self.path:
+                    status, body = 200, {"id": str(len(server.messages)), "content": payload.get("content", "")}
+                self._respond(status, headers, body)
+
+            def do_GET(self):
+                if self.path == "/_mock/stats":
+                    self._respond(200, {}, server.stats())
+                elif self.path == "/_mock/messages":
+                    with server._lock:
+                        messages = list(server.messages)
+                    self._respond(200, {}, messages)
+                else:
+                    self._respond(404, {}, {"message": "Not Found", "code": 0})
+
+            def _respond(self, status: int, headers: dict, body):
+                data = b"" if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # 1リクエストごとのアクセスログは出さない（ベンチマークの出力が埋もれるため）
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discord Webhook の代わりのローカルHTTPサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate-limit", type=int, default=5, help="Webhookごとに window 秒あたり送れる回数")
+    parser.add_argument("--window", type=float, default=2.0, help="レート制限の期間（秒）")
+    parser.add_argument("--global-rate-limit", type=int, default=None, help="全体で1秒あたり送れる回数")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に足すゆらぎの上限（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="サーバーエラーを返す割合（0〜1）")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    mock = MockDiscordWebhookServer(
+        host=args.host,
+        port=args.port,
+        rate_limit=args.rate_limit,
+        window_seconds=args.window,
+        global_rate_limit=args.global_rate_limit,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    print(f"Discord Webhook のモックを起動しました: {mock.webhook_url()}")
+    print("Ctrl+C で停止します。")
+    try:
+        mock._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock._httpd.server_close()
+        print(f"\n受け取ったメッセージ: {mock.stats()}")